@@ -1,6 +1,9 @@
 import xarray as xr
 from titiler_patch.factory_patch import TilerFactory
+from titiler_patch.scheduler import tile_scheduler
+from titiler_patch.store_pool import store_pool
 from titiler.xarray.extensions import VariablesExtension
+from titiler.core.errors import DEFAULT_STATUS_CODES, add_exception_handlers
 import uvicorn
 from fastapi import FastAPI
 from fastapi.responses import HTMLResponse
@@ -14,6 +17,9 @@ app = FastAPI(
     docs_url="/api.html"
 )
 
+# Map reader errors (e.g invalid `sel`) to HTTP status codes
+add_exception_handlers(app, DEFAULT_STATUS_CODES)
+
 # 4. Create TilerFactory with VariablesExtension
 # The default Reader will work with your zarr dataset
 md = TilerFactory(
@@ -154,6 +160,13 @@ async def viewer():
                 {"".join(f'<option value="{t}">{t}</option>' for t in times)}
             </select>
             
+            <label>Baseline (anomaly):</label>
+            <select id="baselineSelect">
+                <option value="">None</option>
+                <option value="climatology">Monthly climatology (multi-year stores)</option>
+                {"".join(f'<option value="time={t}">Minus {t[:7]}</option>' for t in times)}
+            </select>
+
             <label>Colormap:</label>
             <select id="colormapSelect">
                 <option value="inferno">Inferno</option>
@@ -164,6 +177,7 @@ async def viewer():
                 <option value="turbo">Turbo</option>
                 <option value="hot">Hot</option>
                 <option value="cool">Cool</option>
+                <option value="rdbu_r">RdBu (diverging)</option>
             </select>
             
             <label>Rescale (min,max):</label>
@@ -266,6 +280,7 @@ async def viewer():
                 var colormap = document.getElementById('colormapSelect').value;
                 var rescale = document.getElementById('rescaleInput').value;
                 var opacity = document.getElementById('opacitySlider').value;
+                var baseline = document.getElementById('baselineSelect').value;
                 
                 // Update info
                 document.getElementById('currentVar').textContent = variable;
@@ -278,6 +293,11 @@ async def viewer():
                 // Build tile URL - using the dataset file path directly
                 var tileUrl = `https://gfedashboard.onrender.com/md/tiles/WorldMercatorWGS84Quad/{{z}}/{{x}}/{{y}}.png?url=${{url_data}}&variable=${{variable}}&sel=time%3D${{time}}&colormap_name=${{colormap}}&nodata=0`;
                 
+                // Anomaly: subtract the baseline (zeros are then valid values, not nodata)
+                if (baseline) {{
+                    tileUrl = tileUrl.replace('&nodata=0', '') + `&baseline=${{encodeURIComponent(baseline)}}`;
+                }}
+
                 // Add rescale parameter if specified
                 if (rescale && rescale.trim()) {{
                     tileUrl += `&rescale=${{rescale}}`;
@@ -350,6 +370,7 @@ async def viewer():
             document.getElementById('variableSelect').addEventListener('change', updateLayer);
             document.getElementById('timeSelect').addEventListener('change', updateLayer);
             document.getElementById('colormapSelect').addEventListener('change', updateLayer);
+            document.getElementById('baselineSelect').addEventListener('change', updateLayer);
         </script>
     </body>
     </html>
@@ -361,6 +382,20 @@ async def viewer():
 async def health_check():
     return {"status": "healthy", "dataset_loaded": True}
 
+@app.on_event("shutdown")
+def close_store_pool():
+    store_pool.close()
+
+# Connection pool statistics for the remote Zarr stores
+@app.get("/health/pool")
+async def pool_stats():
+    return store_pool.stats()
+
+# Tile scheduler statistics (queue, cancellations, rejections)
+@app.get("/health/tiles")
+async def tile_scheduler_stats():
+    return tile_scheduler.stats()
+
 # 9. Root redirect
 @app.get("/viewer")
 async def viewer_redirect():
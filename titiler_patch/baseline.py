@@ -0,0 +1,109 @@
+"""Baseline fields: cached reference time steps and precomputed monthly climatologies."""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable
+
+import attr
+import numpy
+import xarray
+
+BASELINE_CACHE_SIZE = int(os.environ.get("GFED_BASELINE_CACHE_SIZE", 8))
+BASELINE_READ_WORKERS = int(os.environ.get("GFED_BASELINE_READ_WORKERS", 8))
+
+CLIMATOLOGY = "climatology"
+
+# Suffix of the precomputed climatology stores (see `titiler_patch.climatology`)
+CLIMATOLOGY_SUFFIX = "_climatology.zarr"
+
+
+def monthly_climatology(
+    da: xarray.DataArray, workers: int = BASELINE_READ_WORKERS
+) -> xarray.DataArray:
+    """Multi-year monthly mean of a `(time, y, x)` DataArray.
+
+    Time steps are read `workers` at a time (one chunk each on the map
+    stores) and accumulated per calendar month, so memory stays at 12 +
+    `workers` 2D fields whatever the length of the series.
+
+    Returns:
+        xarray.DataArray: `(month, y, x)` float32 array, months 1-12 (NaN where a month has no data).
+
+    """
+    months = da["time"].dt.month.values
+    shape = (12,) + da.shape[1:]
+    total = numpy.zeros(shape, dtype="float64")
+    count = numpy.zeros(shape, dtype="uint32")
+
+    def _read(i: int) -> numpy.ndarray:
+        return numpy.asarray(da[i].values, dtype="float64")
+
+    workers = max(workers, 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch in range(0, len(months), workers):
+            positions = range(batch, min(batch + workers, len(months)))
+            for i, values in zip(positions, executor.map(_read, positions)):
+                valid = numpy.isfinite(values)
+                total[months[i] - 1][valid] += values[valid]
+                count[months[i] - 1] += valid
+
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        mean = numpy.where(count > 0, total / count, numpy.nan).astype("float32")
+
+    template = da.isel(time=0, drop=True)
+    return xarray.DataArray(
+        mean,
+        dims=("month",) + template.dims,
+        coords={"month": numpy.arange(1, 13), **template.coords},
+        attrs=da.attrs,
+        name=da.name,
+    )
+
+
+@attr.s
+class BaselineCache:
+    """LRU cache of reference baseline fields, computed once per key.
+
+    Concurrent requests for a baseline that isn't cached yet wait for a
+    single computation instead of all reading the whole variable.
+
+    """
+
+    maxsize: int = attr.ib(default=BASELINE_CACHE_SIZE)
+
+    _entries: "OrderedDict[Hashable, xarray.DataArray]" = attr.ib(
+        init=False, factory=OrderedDict
+    )
+    _lock: threading.Lock = attr.ib(init=False, factory=threading.Lock)
+    _key_locks: Dict[Hashable, threading.Lock] = attr.ib(init=False, factory=dict)
+
+    def get(
+        self, key: Hashable, compute: Callable[[], xarray.DataArray]
+    ) -> xarray.DataArray:
+        """Return the cached baseline for `key`, computing it if needed."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    return self._entries[key]
+
+            baseline = compute()
+
+            with self._lock:
+                self._entries[key] = baseline
+                self._key_locks.pop(key, None)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+        return baseline
+
+
+baseline_cache = BaselineCache()
@@ -0,0 +1,128 @@
+"""Precomputed monthly climatology stores for `baseline=climatology` anomalies.
+
+A climatology is the mean of every time step of a variable, so building it
+inside a tile request would read the whole series (252 chunks for 21 years
+of monthly data) while holding a worker. This module computes it offline and
+writes it as a small `(month, y, x)` store next to the map store, which the
+reader opens lazily: a tile then reads one month of it, a click a few pixels.
+
+Usage:
+
+    python -m titiler_patch.climatology GFED5_combined_2002_2022.zarr
+
+"""
+
+import argparse
+from typing import List, Optional
+
+import numpy
+
+from titiler_patch.baseline import (
+    BASELINE_READ_WORKERS,
+    CLIMATOLOGY_SUFFIX,
+    monthly_climatology,
+)
+from titiler_patch.io_patch import get_variable, sidecar_path, xarray_open_dataset
+
+
+def write_climatology_store(
+    src_path: str,
+    dst_path: Optional[str] = None,
+    variables: Optional[List[str]] = None,
+    spatial_chunk: int = 256,
+    workers: int = BASELINE_READ_WORKERS,
+) -> str:
+    """Compute and write the monthly climatology of a Zarr store.
+
+    Args:
+        src_path (str): Zarr store path or URL.
+        dst_path (str, optional): output store. Defaults to `sidecar_path(src_path, CLIMATOLOGY_SUFFIX)`.
+        variables (list of str, optional): variables to average. Defaults to every `(time, y, x)` variable.
+        spatial_chunk (int): chunk size along each spatial dimension (one month per chunk).
+        workers (int): time steps read concurrently.
+
+    Returns:
+        str: path of the written store.
+
+    """
+    dst_path = dst_path or sidecar_path(src_path, CLIMATOLOGY_SUFFIX)
+
+    with xarray_open_dataset(src_path) as ds:
+        if variables is None:
+            variables = [name for name, da in ds.data_vars.items() if "time" in da.dims]
+
+        mode = "w"
+        for name in variables:
+            da = get_variable(ds, name)
+            if da.dims != ("time", "y", "x"):
+                raise ValueError(f"{name!r} is not a (time, y, x) variable: {da.dims}")
+
+            years = numpy.unique(da["time"].dt.year.values)
+            if len(years) < 2:
+                raise ValueError(
+                    f"{name!r} covers {len(years)} year(s), a climatology needs at least 2"
+                )
+
+            clim = monthly_climatology(da, workers=workers)
+            clim.encoding.clear()
+
+            chunks = (
+                1,
+                min(spatial_chunk, clim.sizes["y"]),
+                min(spatial_chunk, clim.sizes["x"]),
+            )
+            clim.to_dataset().to_zarr(
+                dst_path,
+                mode=mode,
+                zarr_format=3,
+                encoding={name: {"chunks": chunks}},
+            )
+            mode = "a"
+
+    return dst_path
+
+
+def main(args: Optional[List[str]] = None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(
+        description="Write the monthly climatology store used for `baseline=climatology`."
+    )
+    parser.add_argument("src_path", help="Zarr store path or URL.")
+    parser.add_argument(
+        "--dst-path",
+        default=None,
+        help=f"Output store. Defaults to `<src>{CLIMATOLOGY_SUFFIX}`.",
+    )
+    parser.add_argument(
+        "--variable",
+        dest="variables",
+        action="append",
+        default=None,
+        help="Variable to average (repeatable). Defaults to all time-varying variables.",
+    )
+    parser.add_argument(
+        "--spatial-chunk",
+        type=int,
+        default=256,
+        help="Chunk size along each spatial dimension.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=BASELINE_READ_WORKERS,
+        help="Time steps read concurrently.",
+    )
+    opts = parser.parse_args(args)
+
+    dst = write_climatology_store(
+        opts.src_path,
+        dst_path=opts.dst_path,
+        variables=opts.variables,
+        spatial_chunk=opts.spatial_chunk,
+        workers=opts.workers,
+    )
+    print(f"Wrote {dst}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""titiler_patch dependencies."""
+
+import functools
+from dataclasses import dataclass
+from typing import List, Literal, Optional
+
+from fastapi import HTTPException, Query
+from rio_tiler.colormap import cmap as default_cmap
+from rio_tiler.types import ColorMapType
+from typing_extensions import Annotated
+
+from titiler.core.dependencies import (
+    ColorMapParams,
+    DefaultDependency,
+    ImageRenderingParams,
+)
+from titiler.xarray.dependencies import XarrayParams
+
+
+@dataclass
+class XarrayBaselineParams(XarrayParams):
+    """Xarray Reader dependency with anomaly/difference baseline."""
+
+    baseline: Annotated[
+        Optional[str],
+        Query(
+            description="Subtract a baseline: `climatology` (multi-year monthly mean) or a reference `{dimension}={value}` (e.g `time=2002-01-01T01:00:00`).",
+        ),
+    ] = None
+
+
+@dataclass
+class ExportParams(DefaultDependency):
+    """Subset (bbox x time x variables) export options."""
+
+    variables: Annotated[
+        List[str],
+        Query(alias="variable", description="Xarray Variable name(s) to export."),
+    ]
+
+    bbox: Annotated[
+        Optional[str],
+        Query(description="Bounding box `minx,miny,maxx,maxy` in the dataset CRS."),
+    ] = None
+
+    start: Annotated[
+        Optional[str],
+        Query(description="First time step (inclusive), e.g `2002-03`."),
+    ] = None
+
+    end: Annotated[
+        Optional[str],
+        Query(description="Last time step (inclusive), e.g `2002-08`."),
+    ] = None
+
+    def __post_init__(self):
+        """Post Init."""
+        if self.bbox is not None:
+            try:
+                minx, miny, maxx, maxy = map(float, self.bbox.split(","))
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Invalid bbox {self.bbox!r}, expected `minx,miny,maxx,maxy`",
+                ) from e
+
+            if minx >= maxx or miny >= maxy:
+                raise HTTPException(status_code=400, detail=f"Empty bbox {self.bbox!r}")
+
+            self.bbox = (minx, miny, maxx, maxy)
+
+
+class NamedColorMap(dict):
+    """Colormap dictionary that remembers its name (used as LUT cache key)."""
+
+    def __init__(self, name: str, colormap: ColorMapType):
+        """Set name."""
+        super().__init__(colormap)
+        self.name = name
+
+
+@functools.lru_cache(maxsize=None)
+def get_named_colormap(name: str) -> NamedColorMap:
+    """Load a registered colormap once (`cmap.get` re-reads the .npy every call)."""
+    return NamedColorMap(name, default_cmap.get(name))
+
+
+def CachedColorMapParams(
+    colormap_name: Annotated[  # type: ignore
+        Literal[tuple(default_cmap.list())],
+        Query(description="Colormap name"),
+    ] = None,
+    colormap: Annotated[
+        Optional[str], Query(description="JSON encoded custom Colormap")
+    ] = None,
+) -> Optional[ColorMapType]:
+    """Colormap dependency resolving named colormaps from an in-memory cache."""
+    if colormap_name:
+        return get_named_colormap(colormap_name)
+
+    return ColorMapParams(colormap=colormap)
+
+
+@dataclass
+class TileRenderingParams(ImageRenderingParams):
+    """Image Rendering options with PNG compression level."""
+
+    zlevel: Annotated[
+        Optional[int],
+        Query(
+            ge=0,
+            le=9,
+            description="zlib compression level of paletted PNG tiles (0-9, lower is faster). Defaults to `GFED_PNG_ZLEVEL`.",
+        ),
+    ] = None
@@ -0,0 +1,529 @@
+"""Streaming subset export (bbox x time x variables) as Zarr zip, NetCDF or CSV.
+
+Every writer walks the subset one time step at a time (one chunk of the map
+stores), so memory stays bounded by a single 2D slice per variable whatever
+the size of the requested subset.
+
+"""
+
+import hashlib
+import io
+import json
+import struct
+import zipfile
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import numpy
+import xarray
+
+from titiler_patch.io_patch import InvalidSelection, SelectionIndex, get_variable
+from titiler_patch.store_pool import POOLED_PROTOCOLS, store_pool
+
+BBox = Tuple[float, float, float, float]
+
+EXPORT_MEDIA_TYPES = {
+    "zarr": "application/zip",
+    "nc": "application/x-netcdf",
+    "csv": "text/csv",
+}
+
+
+def select_subset(
+    ds: xarray.Dataset,
+    variables: List[str],
+    bbox: Optional[BBox] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> xarray.Dataset:
+    """Lazily select variables, bbox and time range from a Dataset.
+
+    Args:
+        ds (xarray.Dataset): Xarray Dataset.
+        variables (list of str): Variables to export.
+        bbox (tuple, optional): (minx, miny, maxx, maxy) in the dataset CRS.
+        start (str, optional): first time label (inclusive, partial dates allowed).
+        end (str, optional): last time label (inclusive, partial dates allowed).
+
+    Returns:
+        xarray.Dataset: subset with `(time, y, x)` or `(y, x)` variables.
+
+    """
+    arrays = {name: get_variable(ds, name) for name in variables}
+
+    dims = {da.dims for da in arrays.values()}
+    if len(dims) != 1:
+        raise ValueError(f"Variables must share the same dimensions, got {dims}")
+
+    subset = xarray.Dataset(arrays)
+    if "time" in subset.dims and (start or end):
+        subset = subset.isel(time=_time_positions(subset, start, end))
+
+    if bbox:
+        minx, miny, maxx, maxy = bbox
+        y = subset["y"].values
+        yslice = slice(maxy, miny) if y.size > 1 and y[0] > y[-1] else slice(miny, maxy)
+        subset = subset.sel(x=slice(minx, maxx), y=yslice)
+
+    if not all(subset.sizes.values()):
+        raise ValueError(f"Empty selection: {dict(subset.sizes)}")
+
+    return subset
+
+
+def _time_positions(
+    ds: xarray.Dataset, start: Optional[str], end: Optional[str]
+) -> Union[slice, List[int]]:
+    """Positions of the time steps within [start, end].
+
+    Labels are validated through `SelectionIndex` (malformed ones raise
+    `InvalidSelection`). A partial datetime `end` (e.g `2002-08`) includes
+    its whole period, like pandas partial string indexing.
+
+    """
+    if "time" not in ds.coords:
+        raise InvalidSelection("Dimension 'time' has no coordinate to select on")
+
+    index = SelectionIndex(numpy.asarray(ds["time"].values))
+    if not index.ordered:
+        raise InvalidSelection("Time range selection requires an ordered index")
+
+    lo = 0
+    if start:
+        lo = numpy.searchsorted(index.sorted, index.normalize(start), side="left")
+
+    hi = index.size
+    if end:
+        stop = index.normalize(end)
+        if index.kind == "M":
+            # Last nanosecond of the period `end` stands for
+            label = numpy.datetime64(end.strip())
+            unit, _ = numpy.datetime_data(label.dtype)
+            stop = int(
+                (label + numpy.timedelta64(1, unit))
+                .astype("datetime64[ns]")
+                .astype("int64")
+                - 1
+            )
+        hi = numpy.searchsorted(index.sorted, stop, side="right")
+
+    if lo >= hi:
+        raise InvalidSelection(f"Empty time range {start!r}/{end!r}")
+
+    positions = numpy.sort(index.order[lo:hi])
+    if positions[-1] - positions[0] + 1 == len(positions):
+        return slice(int(positions[0]), int(positions[-1]) + 1)
+
+    return positions.tolist()
+
+
+def _time_steps(ds: xarray.Dataset) -> Iterator[xarray.Dataset]:
+    """Yield the subset one (loaded) time step at a time."""
+    if "time" not in ds.dims:
+        yield ds.load()
+        return
+
+    for i in range(ds.sizes["time"]):
+        yield ds.isel(time=slice(i, i + 1)).load()
+
+
+###############################################################################
+# CSV
+###############################################################################
+def _time_label(value) -> str:
+    if isinstance(value, numpy.datetime64):
+        return str(numpy.datetime_as_string(value))
+    return str(value).replace("%", "%%")
+
+
+def stream_csv(ds: xarray.Dataset) -> Iterator[bytes]:
+    """Stream the subset as CSV rows (`time,x,y,<variables>`)."""
+    names = list(ds.data_vars)
+    has_time = "time" in ds.dims
+
+    yield (
+        ",".join((["time"] if has_time else []) + ["x", "y"] + names) + "\n"
+    ).encode()
+
+    xx, yy = numpy.meshgrid(ds["x"].values, ds["y"].values)
+    coords = [xx.ravel(), yy.ravel()]
+    fmt = ",".join(["%.6f", "%.6f"] + ["%.7g"] * len(names))
+
+    for step in _time_steps(ds):
+        row_fmt = fmt
+        if has_time:
+            # time label is the same for the whole slice, bake it in the row format
+            row_fmt = f"{_time_label(step['time'].values[0])},{fmt}"
+
+        values = [step[name].values.reshape(-1) for name in names]
+        buf = io.BytesIO()
+        numpy.savetxt(buf, numpy.column_stack(coords + values), fmt=row_fmt)
+        yield buf.getvalue()
+
+
+###############################################################################
+# Zarr (zip)
+###############################################################################
+class _ZipSink:
+    """Unseekable file object collecting what `zipfile` writes."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zarr_zip(ds: xarray.Dataset) -> Iterator[bytes]:
+    """Stream the subset as a zipped Zarr (v3) store.
+
+    Time steps are appended one by one to an in-memory store; chunk keys are
+    zipped and dropped as soon as they're written, metadata documents (which
+    change on every append) are zipped last.
+
+    """
+    from zarr.storage import MemoryStore
+
+    store_dict: Dict[str, object] = {}
+    store = MemoryStore(store_dict)
+
+    sink = _ZipSink()
+    archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED)
+
+    def _flush_chunks() -> bytes:
+        for key in [k for k in store_dict if not k.endswith("zarr.json")]:
+            archive.writestr(key, store_dict.pop(key).to_bytes())
+        return sink.drain()
+
+    has_time = "time" in ds.dims
+    for i, step in enumerate(_time_steps(ds)):
+        for da in step.data_vars.values():
+            da.encoding.clear()
+
+        if i == 0:
+            encoding = {
+                name: {
+                    "chunks": tuple(
+                        1 if d == "time" else s for d, s in da.sizes.items()
+                    )
+                }
+                for name, da in step.data_vars.items()
+            }
+            if has_time:
+                encoding["time"] = {"chunks": (1,)}
+            step.to_zarr(store, mode="w", zarr_format=3, encoding=encoding)
+        else:
+            # Only append time-dependent variables, coordinates are already written
+            static = [k for k, v in step.variables.items() if "time" not in v.dims]
+            step.drop_vars(static).to_zarr(
+                store, mode="a", append_dim="time", zarr_format=3
+            )
+
+        yield _flush_chunks()
+
+    for key in list(store_dict):
+        archive.writestr(key, store_dict.pop(key).to_bytes())
+
+    archive.close()
+    yield sink.drain()
+
+
+###############################################################################
+# NetCDF (classic 64-bit offset format)
+###############################################################################
+NC_DIMENSION = 10
+NC_VARIABLE = 11
+NC_ATTRIBUTE = 12
+
+NC_TYPES = {
+    numpy.dtype("int8"): 1,
+    numpy.dtype("int16"): 3,
+    numpy.dtype("int32"): 4,
+    numpy.dtype("float32"): 5,
+    numpy.dtype("float64"): 6,
+}
+NC_CHAR = 2
+
+
+def _padded_size(size: int) -> int:
+    return size + (-size % 4)
+
+
+def _pad(data: bytes) -> bytes:
+    return data + b"\x00" * (_padded_size(len(data)) - len(data))
+
+
+def _nc_name(name: str) -> bytes:
+    encoded = name.encode()
+    return struct.pack(">i", len(encoded)) + _pad(encoded)
+
+
+def _nc_attrs(attrs: Dict) -> bytes:
+    items = []
+    for key, value in attrs.items():
+        if isinstance(value, str):
+            data = value.encode()
+            items.append(
+                _nc_name(key) + struct.pack(">ii", NC_CHAR, len(data)) + _pad(data)
+            )
+            continue
+
+        arr = numpy.atleast_1d(numpy.asarray(value))
+        if arr.ndim != 1 or arr.dtype.kind not in "biuf":
+            continue
+
+        arr = arr.astype("float64" if arr.dtype.kind == "f" else "int32")
+        items.append(
+            _nc_name(key)
+            + struct.pack(">ii", NC_TYPES[arr.dtype], arr.size)
+            + _pad(arr.astype(arr.dtype.newbyteorder(">")).tobytes())
+        )
+
+    if not items:
+        return struct.pack(">ii", 0, 0)
+
+    return struct.pack(">ii", NC_ATTRIBUTE, len(items)) + b"".join(items)
+
+
+def _nc_dtype(dtype: numpy.dtype) -> numpy.dtype:
+    dtype = numpy.dtype(dtype)
+    if dtype in NC_TYPES:
+        return dtype
+    if dtype.kind in "iub" and dtype.itemsize < 2:
+        return numpy.dtype("int16")
+    return numpy.dtype("float64")
+
+
+class NetCDFStream:
+    """Byte-addressable NetCDF (CDF-2) rendering of a subset.
+
+    The classic format lays out a header, fixed-size variables and then one
+    record per time step, so the file size and the offset of every slice are
+    known up front. That lets the export answer HTTP Range requests by only
+    reading the time steps overlapping the requested bytes.
+
+    """
+
+    def __init__(self, ds: xarray.Dataset):
+        """Compute the header and the layout of the file."""
+        self.ds = ds
+        self.has_time = "time" in ds.dims
+        self.names = list(ds.data_vars)
+        self.numrecs = ds.sizes["time"] if self.has_time else 0
+
+        ny, nx = ds.sizes["y"], ds.sizes["x"]
+        self.dtypes = {name: _nc_dtype(ds[name].dtype) for name in self.names}
+
+        time_attrs: Dict = {}
+        if self.has_time:
+            self.times = ds["time"].values
+            if numpy.issubdtype(self.times.dtype, numpy.datetime64):
+                time_attrs = {
+                    "units": "days since 1970-01-01 00:00:00",
+                    "calendar": "proleptic_gregorian",
+                }
+                self.times = (
+                    self.times - numpy.datetime64("1970-01-01")
+                ) / numpy.timedelta64(1, "D")
+            self.times = self.times.astype("float64")
+
+        # (name, dimids, attrs, dtype, vsize, is_record)
+        dims = [("y", ny), ("x", nx)]
+        variables = [
+            ("y", [0], dict(ds["y"].attrs), numpy.dtype("float64"), ny * 8, False),
+            ("x", [1], dict(ds["x"].attrs), numpy.dtype("float64"), nx * 8, False),
+        ]
+        grid_dims = [0, 1]
+        if self.has_time:
+            dims = [("time", 0)] + [(n, s) for n, s in dims]
+            variables = [
+                (n, [i + 1 for i in d], a, t, s, r) for n, d, a, t, s, r in variables
+            ]
+            variables.append(("time", [0], time_attrs, numpy.dtype("float64"), 8, True))
+            grid_dims = [0, 1, 2]
+
+        for name in self.names:
+            dtype = self.dtypes[name]
+            attrs = {k: v for k, v in ds[name].attrs.items() if not k.startswith("_")}
+            variables.append(
+                (
+                    name,
+                    grid_dims,
+                    attrs,
+                    dtype,
+                    _padded_size(ny * nx * dtype.itemsize),
+                    self.has_time,
+                )
+            )
+
+        crs = ds[self.names[0]].rio.crs
+        gattrs = {"crs": crs.to_string()} if crs else {}
+
+        header_size = len(self._header(dims, gattrs, variables, [0] * len(variables)))
+
+        # Fixed variables first, then the records
+        begins, offset = [], header_size
+        for var in variables:
+            if not var[5]:
+                begins.append(offset)
+                offset += var[4]
+            else:
+                begins.append(0)
+
+        self.records_begin = offset
+        record_offset = offset
+        for i, var in enumerate(variables):
+            if var[5]:
+                begins[i] = record_offset
+                record_offset += var[4]
+
+        self.record_size = record_offset - offset
+        self.header = self._header(dims, gattrs, variables, begins)
+        self.size = self.records_begin + self.numrecs * self.record_size
+
+    def _header(self, dims, gattrs, variables, begins) -> bytes:
+        parts = [b"CDF\x02", struct.pack(">i", self.numrecs)]
+        parts.append(struct.pack(">ii", NC_DIMENSION, len(dims)))
+        parts.extend(_nc_name(name) + struct.pack(">i", size) for name, size in dims)
+        parts.append(_nc_attrs(gattrs))
+        parts.append(struct.pack(">ii", NC_VARIABLE, len(variables)))
+        for (name, dimids, attrs, dtype, vsize, _), begin in zip(variables, begins):
+            parts.append(
+                _nc_name(name)
+                + struct.pack(">i", len(dimids))
+                + struct.pack(f">{len(dimids)}i", *dimids)
+                + _nc_attrs(attrs)
+                + struct.pack(">iiq", NC_TYPES[dtype], vsize, begin)
+            )
+        return b"".join(parts)
+
+    def _encode(self, arr: numpy.ndarray, dtype: numpy.dtype) -> bytes:
+        return _pad(
+            numpy.ascontiguousarray(arr, dtype=dtype.newbyteorder(">")).tobytes()
+        )
+
+    def _pieces(self) -> Iterator[Tuple[int, Callable[[], bytes]]]:
+        """Yield (size, render) for each contiguous piece of the file."""
+        yield len(self.header), lambda: self.header
+
+        ys, xs = self.ds["y"].values, self.ds["x"].values
+        f8 = numpy.dtype("float64")
+        yield ys.size * 8, lambda: self._encode(ys, f8)
+        yield xs.size * 8, lambda: self._encode(xs, f8)
+
+        if not self.has_time:
+            for name in self.names:
+                dtype = self.dtypes[name]
+                yield _padded_size(self.ds[name].size * dtype.itemsize), (
+                    lambda name=name, dtype=dtype: self._encode(
+                        self.ds[name].values, dtype
+                    )
+                )
+            return
+
+        for i in range(self.numrecs):
+            yield self.record_size, lambda i=i: self._record(i)
+
+    def _record(self, i: int) -> bytes:
+        step = self.ds.isel(time=i).load()
+        parts = [self._encode(self.times[i : i + 1], numpy.dtype("float64"))]
+        parts.extend(
+            self._encode(step[name].values, self.dtypes[name]) for name in self.names
+        )
+        return b"".join(parts)
+
+    def iter_bytes(self, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Stream bytes `start` to `end` (inclusive), rendering only what overlaps."""
+        end = self.size - 1 if end is None else min(end, self.size - 1)
+
+        offset = 0
+        for size, render in self._pieces():
+            if offset > end:
+                break
+
+            if offset + size > start:
+                data = render()
+                yield data[max(start - offset, 0) : end - offset + 1]
+
+            offset += size
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single `bytes=start-end` Range header.
+
+    Returns:
+        tuple: (start, end) inclusive, or None for a missing/unsupported header.
+
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+
+    first, _, last = header[len("bytes=") :].strip().partition("-")
+    try:
+        if not first:
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start, end = int(first), int(last) if last else size - 1
+    except ValueError:
+        return None
+
+    if start >= size or start > end:
+        raise ValueError(f"Range not satisfiable: {header}")
+
+    return start, min(end, size - 1)
+
+
+def _store_version(src_path: str) -> Optional[bytes]:
+    """Bytes that change whenever the store is rewritten or appended to.
+
+    The root metadata document for Zarr stores, the file info (size,
+    modification time or ETag) otherwise. None if neither can be read.
+
+    """
+    import fsspec  # noqa
+
+    for name in ("zarr.json", ".zmetadata"):
+        path = f"{src_path.rstrip('/')}/{name}"
+        try:
+            if urlparse(path).scheme in POOLED_PROTOCOLS:
+                return store_pool.cat_file(path)
+
+            fs, root = fsspec.core.url_to_fs(path)
+            return fs.cat_file(root)
+        except Exception:  # noqa: BLE001  not a Zarr store (or not this version)
+            continue
+
+    try:
+        fs, root = fsspec.core.url_to_fs(src_path)
+        return json.dumps(fs.info(root), sort_keys=True, default=str).encode()
+    except Exception:  # noqa: BLE001
+        return None
+
+
+def export_etag(src_path: str, **params: Any) -> Optional[str]:
+    """Strong ETag of an export: source store version + subset parameters.
+
+    Returns:
+        str: quoted ETag, or None when the store version can't be read.
+
+    """
+    version = _store_version(src_path)
+    if version is None:
+        return None
+
+    digest = hashlib.sha1(
+        json.dumps(
+            {"src_path": src_path, **params}, sort_keys=True, default=str
+        ).encode()
+    )
+    digest.update(version)
+    return f'"{digest.hexdigest()}"'
@@ -1,14 +1,19 @@
 """TiTiler.xarray factory."""
 
-from typing import Any, Callable, Optional, Type, Union
+import os
+from typing import Any, Callable, Literal, Optional, Tuple, Type, Union
 
 import rasterio
 from attrs import define, field
-from fastapi import Body, Depends, Query
+from fastapi import Body, Depends, HTTPException, Path, Query
 from geojson_pydantic.features import Feature, FeatureCollection
+from pydantic import Field
 from rio_tiler.constants import WGS84_CRS
 from rio_tiler.io import XarrayReader
 from rio_tiler.models import Info
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
 from typing_extensions import Annotated
 
 from titiler.core.dependencies import (
@@ -22,11 +27,43 @@ from titiler.core.dependencies import (
     StatisticsParams,
 )
 from titiler.core.factory import TilerFactory as BaseTilerFactory
+from titiler.core.factory import img_endpoint_params
 from titiler.core.models.responses import InfoGeoJSON, StatisticsGeoJSON
+from titiler.core.resources.enums import ImageType
 from titiler.core.resources.responses import GeoJSONResponse, JSONResponse
 from titiler.core.utils import bounds_to_geometry
-from titiler.xarray.dependencies import DatasetParams, PartFeatureParams, XarrayParams
-from titiler_patch.io_patch import Reader
+from titiler.xarray.dependencies import (
+    DatasetParams,
+    PartFeatureParams,
+    XarrayIOParams,
+)
+from titiler_patch.dependencies import (
+    CachedColorMapParams,
+    ExportParams,
+    TileRenderingParams,
+    XarrayBaselineParams,
+)
+from titiler_patch.export import (
+    EXPORT_MEDIA_TYPES,
+    NetCDFStream,
+    export_etag,
+    parse_range,
+    select_subset,
+    stream_csv,
+    stream_zarr_zip,
+)
+from titiler_patch.io_patch import InvalidSelection, Reader, xarray_open_dataset
+from titiler_patch.mask_cache import mask_cache
+from titiler_patch.occupancy import get_occupancy_index
+from titiler_patch.render import empty_tile, negotiate_format, render_tile
+from titiler_patch.scheduler import (
+    CancelToken,
+    SchedulerSaturated,
+    TileCancelled,
+    TileScheduler,
+    tile_scheduler,
+)
+
 
 @define(kw_only=True)
 class TilerFactory(BaseTilerFactory):
@@ -36,7 +73,7 @@ class TilerFactory(BaseTilerFactory):
 
     path_dependency: Callable[..., Any] = DatasetPathParams
 
-    reader_dependency: Type[DefaultDependency] = XarrayParams
+    reader_dependency: Type[DefaultDependency] = XarrayBaselineParams
 
     # Indexes Dependencies
     layer_dependency: Type[DefaultDependency] = BidxParams
@@ -53,6 +90,11 @@ class TilerFactory(BaseTilerFactory):
 
     img_part_dependency: Type[DefaultDependency] = PartFeatureParams
 
+    # Cached colormaps/LUTs and paletted PNG encoding
+    colormap_dependency: Callable[..., Any] = CachedColorMapParams
+    render_dependency: Type[DefaultDependency] = TileRenderingParams
+    render_func: Callable[..., Tuple[bytes, str]] = render_tile
+
     add_viewer: bool = True
     add_part: bool = True
 
@@ -60,6 +102,21 @@ class TilerFactory(BaseTilerFactory):
     img_preview_dependency: Type[DefaultDependency] = field(init=False)
     add_preview: bool = field(init=False, default=False)
 
+    add_export: bool = True
+
+    # Bounded, priority-ordered execution of /tiles requests
+    scheduler: TileScheduler = tile_scheduler
+
+    # Answer empty tiles from the `<store>_occupancy.npz` sidecar (if any)
+    use_occupancy_index: bool = True
+
+    def register_routes(self):
+        """Register default routes plus the /export endpoint."""
+        super().register_routes()
+
+        if self.add_export:
+            self.export()
+
     # Custom /info endpoints (adds `show_times` options)
     def info(self):
         """Register /info endpoint."""
@@ -186,9 +243,10 @@ class TilerFactory(BaseTilerFactory):
                             **dataset_params.as_dict(),
                         )
 
-                        # Get the coverage % array
-                        coverage_array = image.get_coverage_array(
+                        # Get the coverage % array (cached per geometry and grid)
+                        coverage_array = mask_cache.coverage(
                             shape,
+                            image,
                             shape_crs=coord_crs or WGS84_CRS,
                         )
 
@@ -204,4 +262,256 @@ class TilerFactory(BaseTilerFactory):
                         feature.properties = feature.properties or {}
                         feature.properties.update({"statistics": stats})
 
-            return fc.features[0] if isinstance(geojson, Feature) else fc
\ No newline at end of file
+            return fc.features[0] if isinstance(geojson, Feature) else fc
+
+    # custom /tiles endpoints (scheduled, cancelled on client disconnect)
+    def tile(self):  # noqa: C901
+        """Register /tiles endpoint."""
+
+        @self.router.get(
+            "/tiles/{tileMatrixSetId}/{z}/{x}/{y}",
+            operation_id=f"{self.operation_prefix}getTile",
+            **img_endpoint_params,
+        )
+        @self.router.get(
+            "/tiles/{tileMatrixSetId}/{z}/{x}/{y}.{format}",
+            operation_id=f"{self.operation_prefix}getTileWithFormat",
+            **img_endpoint_params,
+        )
+        @self.router.get(
+            "/tiles/{tileMatrixSetId}/{z}/{x}/{y}@{scale}x",
+            operation_id=f"{self.operation_prefix}getTileWithScale",
+            **img_endpoint_params,
+        )
+        @self.router.get(
+            "/tiles/{tileMatrixSetId}/{z}/{x}/{y}@{scale}x.{format}",
+            operation_id=f"{self.operation_prefix}getTileWithFormatAndScale",
+            **img_endpoint_params,
+        )
+        async def tile(
+            request: Request,
+            z: Annotated[
+                int,
+                Path(
+                    description="Identifier (Z) selecting one of the scales defined in the TileMatrixSet and representing the scaleDenominator the tile.",
+                ),
+            ],
+            x: Annotated[
+                int,
+                Path(
+                    description="Column (X) index of the tile on the selected TileMatrix. It cannot exceed the MatrixHeight-1 for the selected TileMatrix.",
+                ),
+            ],
+            y: Annotated[
+                int,
+                Path(
+                    description="Row (Y) index of the tile on the selected TileMatrix. It cannot exceed the MatrixWidth-1 for the selected TileMatrix.",
+                ),
+            ],
+            tileMatrixSetId: Annotated[
+                Literal[tuple(self.supported_tms.list())],
+                Path(
+                    description="Identifier selecting one of the TileMatrixSetId supported."
+                ),
+            ],
+            scale: Annotated[
+                int,
+                Field(
+                    gt=0, le=4, description="Tile size scale. 1=256x256, 2=512x512..."
+                ),
+            ] = 1,
+            format: Annotated[
+                ImageType,
+                Field(
+                    description="Default will be automatically defined if the output image needs a mask (png) or not (jpeg)."
+                ),
+            ] = None,
+            src_path=Depends(self.path_dependency),
+            reader_params=Depends(self.reader_dependency),
+            tile_params=Depends(self.tile_dependency),
+            layer_params=Depends(self.layer_dependency),
+            dataset_params=Depends(self.dataset_dependency),
+            post_process=Depends(self.process_dependency),
+            colormap=Depends(self.colormap_dependency),
+            render_params=Depends(self.render_dependency),
+            env=Depends(self.environment_dependency),
+        ):
+            """Create map tile from a dataset."""
+            tms = self.supported_tms.get(tileMatrixSetId)
+
+            # No extension in the URL: let the client pick webp/png via `Accept`
+            headers = {}
+            if not format:
+                format = negotiate_format(request.headers.get("accept"))
+                headers["Vary"] = "Accept"
+
+            # Only where an empty tile is exactly what the read would give:
+            # zeros are nodata, nothing is added back (baseline/post-process)
+            # and the output is transparent
+            if (
+                self.use_occupancy_index
+                and dataset_params.nodata == 0
+                and not reader_params.baseline
+                and not reader_params.group
+                and post_process is None
+                and render_params.add_mask is not False
+                and format in (None, ImageType.png, ImageType.webp)
+            ):
+
+                def _has_data() -> bool:
+                    index = get_occupancy_index(src_path)
+                    return index is None or index.tile_has_data(
+                        reader_params.variable,
+                        reader_params.sel,
+                        reader_params.method,
+                        tms,
+                        x,
+                        y,
+                        z,
+                    )
+
+                if not await run_in_threadpool(_has_data):
+                    output_format = format or ImageType.png
+                    return Response(
+                        empty_tile(output_format, scale * 256, scale * 256),
+                        media_type=output_format.mediatype,
+                        headers=headers,
+                    )
+
+            def _render(token: CancelToken):
+                token.checkpoint("open")
+                with rasterio.Env(**env):
+                    with self.reader(
+                        src_path, tms=tms, **reader_params.as_dict()
+                    ) as src_dst:
+                        # read + reproject
+                        token.checkpoint("read")
+                        image = src_dst.tile(
+                            x,
+                            y,
+                            z,
+                            tilesize=scale * 256,
+                            **tile_params.as_dict(),
+                            **layer_params.as_dict(),
+                            **dataset_params.as_dict(),
+                        )
+                        dst_colormap = getattr(src_dst, "colormap", None)
+
+                if post_process:
+                    token.checkpoint("post_process")
+                    image = post_process(image)
+
+                token.checkpoint("encode")
+                return self.render_func(
+                    image,
+                    output_format=format,
+                    colormap=colormap or dst_colormap,
+                    **render_params.as_dict(),
+                )
+
+            try:
+                content, media_type = await self.scheduler.run(
+                    request, _render, priority=(z,)
+                )
+            except SchedulerSaturated as e:
+                raise HTTPException(
+                    status_code=503,
+                    detail=str(e),
+                    headers={"Retry-After": str(self.scheduler.retry_after)},
+                ) from e
+            except TileCancelled:
+                # Nobody is listening anymore (499: client closed request)
+                return Response(status_code=499)
+
+            return Response(content, media_type=media_type, headers=headers)
+
+    # /export endpoint (streamed bbox x time x variables subsets)
+    def export(self):
+        """Register /export endpoint."""
+
+        @self.router.get(
+            "/export.{format}",
+            response_class=StreamingResponse,
+            responses={
+                200: {
+                    "content": {m: {} for m in EXPORT_MEDIA_TYPES.values()},
+                    "description": "Stream a subset of the dataset.",
+                },
+                206: {"description": "Partial content (NetCDF only)."},
+            },
+            operation_id=f"{self.operation_prefix}getExport",
+        )
+        def export(
+            request: Request,
+            format: Annotated[
+                Literal[tuple(EXPORT_MEDIA_TYPES)],
+                Path(description="Output format: zipped Zarr, NetCDF or CSV."),
+            ],
+            src_path=Depends(self.path_dependency),
+            io_params=Depends(XarrayIOParams),
+            export_params=Depends(ExportParams),
+        ):
+            """Stream a bbox x time x variables subset, one time step at a time."""
+            ds = xarray_open_dataset(src_path, **io_params.as_dict())
+            try:
+                subset = select_subset(ds, **export_params.as_dict())
+            except (InvalidSelection, KeyError, ValueError) as e:
+                ds.close()
+                raise HTTPException(status_code=400, detail=str(e)) from e
+
+            stem = os.path.splitext(os.path.basename(src_path.rstrip("/")))[0]
+            filename = f"{stem}_subset.{'zarr.zip' if format == 'zarr' else format}"
+            headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+            status_code = 200
+
+            if format == "nc":
+                nc = NetCDFStream(subset)
+                etag = export_etag(
+                    src_path, **io_params.as_dict(), **export_params.as_dict()
+                )
+                if etag:
+                    headers["ETag"] = etag
+
+                # Only resume the same version of the file (RFC 9110 If-Range)
+                range_header = request.headers.get("range")
+                if_range = request.headers.get("if-range")
+                if if_range is not None and if_range != etag:
+                    range_header = None
+
+                try:
+                    byte_range = parse_range(range_header, nc.size)
+                except ValueError as e:
+                    ds.close()
+                    raise HTTPException(
+                        status_code=416,
+                        detail=str(e),
+                        headers={"Content-Range": f"bytes */{nc.size}"},
+                    ) from e
+
+                start, end = byte_range or (0, nc.size - 1)
+                headers["Accept-Ranges"] = "bytes"
+                headers["Content-Length"] = str(end - start + 1)
+                if byte_range:
+                    status_code = 206
+                    headers["Content-Range"] = f"bytes {start}-{end}/{nc.size}"
+
+                content = nc.iter_bytes(start, end)
+
+            elif format == "zarr":
+                content = stream_zarr_zip(subset)
+
+            else:
+                content = stream_csv(subset)
+
+            def _stream():
+                try:
+                    yield from content
+                finally:
+                    ds.close()
+
+            return StreamingResponse(
+                _stream(),
+                status_code=status_code,
+                media_type=EXPORT_MEDIA_TYPES[format],
+                headers=headers,
+            )
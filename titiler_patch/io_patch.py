@@ -1,15 +1,73 @@
 """titiler.xarray.io"""
 
-from typing import Any, Callable, Dict, List, Literal, Optional, Union
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Literal, Optional, Tuple, Union
 from urllib.parse import urlparse
 
 import attr
+import numpy
 import xarray
 from morecantile import TileMatrixSet
-from rio_tiler.constants import WEB_MERCATOR_TMS
+from rasterio.crs import CRS
+from rasterio.features import bounds as featureBounds
+from rio_tiler.constants import WEB_MERCATOR_TMS, WGS84_CRS
 from rio_tiler.io.xarray import XarrayReader
+from rio_tiler.models import ImageData, PointData
+from rio_tiler.types import BBox
+from rio_tiler.utils import _validate_shape_input
+from titiler.core.errors import BadRequestError
 from xarray.namedarray.utils import module_available
 
+from titiler_patch.baseline import CLIMATOLOGY, CLIMATOLOGY_SUFFIX, baseline_cache
+from titiler_patch.mask_cache import mask_cache
+from titiler_patch.store_pool import POOLED_PROTOCOLS, store_pool
+
+# Suffix of the time-contiguous companion stores (see `titiler_patch.rechunk`)
+TIMESERIES_SUFFIX = "_timeseries.zarr"
+
+# How long (seconds) the result of a companion/sidecar file probe is reused
+PROBE_TTL = float(os.environ.get("GFED_PROBE_TTL", 300))
+
+
+def ttl_cache(ttl: float = PROBE_TTL, maxsize: int = 128):
+    """Like `functools.lru_cache`, but entries expire after `ttl` seconds.
+
+    Used for probes of files written next to a store (companion store,
+    sidecars), so a file created after startup, or a probe that failed
+    transiently, is picked up again without a restart.
+
+    """
+
+    def decorator(func):
+        entries: "OrderedDict[Tuple, Tuple[Any, float]]" = OrderedDict()
+        lock = threading.Lock()
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            now = time.monotonic()
+            with lock:
+                if args in entries and now - entries[args][1] < ttl:
+                    entries.move_to_end(args)
+                    return entries[args][0]
+
+            value = func(*args)
+            with lock:
+                entries[args] = (value, now)
+                entries.move_to_end(args)
+                while len(entries) > maxsize:
+                    entries.popitem(last=False)
+
+            return value
+
+        wrapper.cache_clear = entries.clear
+        return wrapper
+
+    return decorator
+
 
 def xarray_open_dataset(  # noqa: C901
     src_path: str,
@@ -79,9 +137,13 @@ def xarray_open_dataset(  # noqa: C901
     # Fallback to Zarr
     else:
         if module_available("zarr", minversion="3.0"):
-            store = zarr.storage.FsspecStore.from_url(
-                src_path, storage_options={"asynchronous": True}
-            )
+            if protocol in POOLED_PROTOCOLS:
+                # Reuse the long-lived per-endpoint session (keep-alive, retries)
+                store = store_pool.store(src_path)
+            else:
+                store = zarr.storage.FsspecStore.from_url(
+                    src_path, storage_options={"asynchronous": True}
+                )
         else:
             store = fsspec.filesystem(protocol).get_mapper(src_path)
 
@@ -89,6 +151,39 @@ def xarray_open_dataset(  # noqa: C901
     return ds
 
 
+def sidecar_path(src_path: str, suffix: str) -> str:
+    """Return the path of a file or store written next to a Zarr store.
+
+    Args:
+        src_path (str): map-optimized Zarr store path or URL.
+        suffix (str): sidecar suffix (e.g `TIMESERIES_SUFFIX`).
+
+    Returns:
+        str: sidecar path (e.g `GFED5_2002.zarr` -> `GFED5_2002_timeseries.zarr`).
+
+    """
+    path = src_path.rstrip("/")
+    if path.lower().endswith(".zarr"):
+        path = path[: -len(".zarr")]
+
+    return path + suffix
+
+
+@ttl_cache()
+def _store_exists(path: str) -> bool:
+    """Check (at most once per `PROBE_TTL`) if a companion store was written."""
+    import fsspec  # noqa
+
+    try:
+        if urlparse(path).scheme in POOLED_PROTOCOLS:
+            return store_pool.exists(f"{path.rstrip('/')}/zarr.json")
+
+        fs, root = fsspec.core.url_to_fs(path)
+        return fs.exists(f"{root.rstrip('/')}/zarr.json")
+    except Exception:  # noqa: BLE001  any failure means "not there (yet)"
+        return False
+
+
 def _arrange_dims(da: xarray.DataArray) -> xarray.DataArray:
     """Arrange coordinates and time dimensions.
 
@@ -132,43 +227,227 @@ def _arrange_dims(da: xarray.DataArray) -> xarray.DataArray:
     return da
 
 
+class InvalidSelection(BadRequestError):
+    """Invalid `sel` dimension, label or range."""
+
+
+class SelectionIndex:
+    """Label -> integer position lookup for one dimension coordinate.
+
+    Exact labels resolve through a dict (O(1)), `nearest`/`pad`/`backfill`
+    and `start/end` ranges through a binary search on the sorted values, so
+    selections never scan the whole index and are applied with `isel`.
+
+    """
+
+    def __init__(self, values: numpy.ndarray):
+        """Build the lookup tables."""
+        self.dtype = values.dtype
+        self.kind = values.dtype.kind
+        # First/last labels, to detect a coordinate that changed (see `matches`)
+        self.edges = (values[0], values[-1]) if len(values) else ()
+
+        if self.kind == "M":
+            values = values.astype("datetime64[ns]").astype("int64")
+        elif self.kind not in "biuf":
+            values = numpy.array([str(v) for v in values], dtype=object)
+
+        self.size = len(values)
+        self.positions: Dict[Hashable, int] = {}
+        for i, v in enumerate(values.tolist()):
+            self.positions.setdefault(v, i)
+
+        self.ordered = self.kind in "Mbiuf"
+        if self.ordered:
+            self.order = numpy.argsort(values, kind="stable")
+            self.sorted = values[self.order]
+
+        # raw request string -> position, for labels already resolved once
+        self._labels: Dict[str, int] = {}
+
+    def normalize(self, label: str) -> Hashable:
+        """Cast a request label to the normalized key type of the index."""
+        try:
+            if self.kind == "M":
+                return int(
+                    numpy.datetime64(label.strip())
+                    .astype("datetime64[ns]")
+                    .astype("int64")
+                )
+            if self.kind == "b":
+                return int(label)
+            if self.kind in "iuf":
+                # Same precision as the index keys (e.g float32 coordinates)
+                return self.dtype.type(label.strip()).item()
+        except (ValueError, OverflowError) as e:
+            raise InvalidSelection(f"Invalid label {label!r}: {e}") from e
+
+        return label
+
+    def matches(self, values: numpy.ndarray) -> bool:
+        """Cheap check that `values` is still the coordinate this index was built on."""
+        if len(values) != self.size:
+            return False
+
+        return not self.size or (
+            values[0] == self.edges[0] and values[-1] == self.edges[-1]
+        )
+
+    def position(self, label: str, method: Optional[str] = None) -> int:
+        """Integer position of a label (exact match unless `method` is set)."""
+        if label in self._labels:
+            return self._labels[label]
+
+        key = self.normalize(label)
+        if key in self.positions:
+            pos = self.positions[key]
+            if len(self._labels) < 4 * self.size:
+                self._labels[label] = pos
+            return pos
+
+        if not method:
+            raise InvalidSelection(f"Label {label!r} not found")
+
+        if not self.ordered:
+            raise InvalidSelection(f"Method {method!r} requires an ordered index")
+
+        i = int(numpy.searchsorted(self.sorted, key))
+        if method == "nearest":
+            candidates = [j for j in (i - 1, i) if 0 <= j < self.size]
+            i = min(candidates, key=lambda j: abs(self.sorted[j] - key))
+        elif method in ("pad", "ffill"):
+            i -= 1
+        # backfill/bfill: first value >= key, which is `i`
+
+        if not 0 <= i < self.size:
+            raise InvalidSelection(f"No {method} match for label {label!r}")
+
+        return int(self.order[i])
+
+    def range(self, start: str, stop: str) -> Union[slice, List[int]]:
+        """Positions of the labels within [start, stop] (inclusive)."""
+        if not self.ordered:
+            raise InvalidSelection("Range selection requires an ordered index")
+
+        lo = numpy.searchsorted(self.sorted, self.normalize(start), side="left")
+        hi = numpy.searchsorted(self.sorted, self.normalize(stop), side="right")
+        if lo >= hi:
+            raise InvalidSelection(f"Empty range {start!r}/{stop!r}")
+
+        positions = numpy.sort(self.order[lo:hi])
+        if positions[-1] - positions[0] + 1 == len(positions):
+            return slice(int(positions[0]), int(positions[-1]) + 1)
+
+        return positions.tolist()
+
+
+_SELECTION_INDEXES: "OrderedDict[Tuple, SelectionIndex]" = OrderedDict()
+_SELECTION_INDEXES_SIZE = 256
+_selection_lock = threading.Lock()
+
+
+def get_selection_index(
+    coord: xarray.DataArray, dataset_key: Optional[Hashable] = None
+) -> SelectionIndex:
+    """Return the SelectionIndex of a dimension coordinate.
+
+    Datasets are re-opened per request, so indexes are cached by dataset
+    (e.g `(src_path, group)`) and coordinate name. A cached index is reused
+    as long as the coordinate length and first/last labels are unchanged
+    (O(1)), otherwise (e.g a store that got appended to) it is rebuilt.
+    Without `dataset_key` the index is built and not cached.
+
+    """
+    values = numpy.asarray(coord.values)
+    if dataset_key is None:
+        return SelectionIndex(values)
+
+    key = (dataset_key, coord.name)
+    with _selection_lock:
+        index = _SELECTION_INDEXES.get(key)
+        if index is not None and index.matches(values):
+            _SELECTION_INDEXES.move_to_end(key)
+            return index
+
+    index = SelectionIndex(values)
+    with _selection_lock:
+        _SELECTION_INDEXES[key] = index
+        while len(_SELECTION_INDEXES) > _SELECTION_INDEXES_SIZE:
+            _SELECTION_INDEXES.popitem(last=False)
+
+    return index
+
+
+def _selection_positions(
+    da: xarray.DataArray,
+    sel: List[str],
+    method: Optional[str] = None,
+    dataset_key: Optional[Hashable] = None,
+) -> Dict[str, Union[int, slice, List[int]]]:
+    """Validate `sel` and resolve it to `isel` positions."""
+    labels: Dict[str, List[str]] = {}
+    for s in sel:
+        dim, sep, val = s.partition("=")
+        if not sep or not dim or not val:
+            raise InvalidSelection(f"Invalid selection {s!r}, expected `dim=value`")
+
+        if dim not in da.dims:
+            raise InvalidSelection(
+                f"Invalid dimension {dim!r} for {da.name!r}, available: {list(da.dims)}"
+            )
+
+        if dim not in da.coords:
+            raise InvalidSelection(f"Dimension {dim!r} has no coordinate to select on")
+
+        labels.setdefault(dim, []).append(val)
+
+    isel_idx: Dict[str, Union[int, slice, List[int]]] = {}
+    for dim, values in labels.items():
+        index = get_selection_index(da[dim], dataset_key=dataset_key)
+
+        # `start/end` range (only for datetime/numeric dimensions)
+        if len(values) == 1 and index.ordered and "/" in values[0]:
+            start, _, stop = values[0].partition("/")
+            isel_idx[dim] = index.range(start, stop)
+            continue
+
+        positions = [index.position(v, method=method) for v in values]
+        isel_idx[dim] = positions[0] if len(positions) == 1 else positions
+
+    return isel_idx
+
+
 def get_variable(
     ds: xarray.Dataset,
     variable: str,
     sel: Optional[List[str]] = None,
     method: Optional[Literal["nearest", "pad", "ffill", "backfill", "bfill"]] = None,
+    dataset_key: Optional[Hashable] = None,
 ) -> xarray.DataArray:
     """Get Xarray variable as DataArray.
 
     Args:
         ds (xarray.Dataset): Xarray Dataset.
         variable (str): Variable to extract from the Dataset.
-        sel (list of str, optional): List of Xarray Indexes.
+        sel (list of str, optional): List of Xarray Indexes (`dim=value` or `dim=start/end`).
         method (str): Xarray indexing method.
+        dataset_key (hashable, optional): Dataset identity (e.g `(src_path, group)`) used to cache the selection indexes.
 
     Returns:
         xarray.DataArray: 2D or 3D DataArray.
 
     """
+    if variable not in ds.variables:
+        raise InvalidSelection(
+            f"Invalid variable {variable!r}, available: {list(ds.data_vars)}"
+        )
+
     da = ds[variable]
 
     if sel:
-        _idx: Dict[str, List] = {}
-        for s in sel:
-            val: Union[str, slice]
-            dim, val = s.split("=")
-
-            # cast string to dtype of the dimension
-            if da[dim].dtype != "O":
-                val = da[dim].dtype.type(val)
-
-            if dim in _idx:
-                _idx[dim].append(val)
-            else:
-                _idx[dim] = [val]
-
-        sel_idx = {k: v[0] if len(v) < 2 else v for k, v in _idx.items()}
-        da = da.sel(sel_idx, method=method)
+        da = da.isel(
+            _selection_positions(da, sel, method=method, dataset_key=dataset_key)
+        )
 
     da = _arrange_dims(da)
 
@@ -209,8 +488,22 @@ class Reader(XarrayReader):
 
     tms: TileMatrixSet = attr.ib(default=WEB_MERCATOR_TMS)
 
+    # Time-contiguous store used for point/time-series queries.
+    # Defaults to `sidecar_path(src_path, TIMESERIES_SUFFIX)` when that store exists.
+    timeseries_path: Optional[str] = attr.ib(default=None)
+
+    # Render anomalies: `climatology` (multi-year monthly mean) or a
+    # reference selection (e.g `time=2002-01-01`) subtracted from the data.
+    baseline: Optional[str] = attr.ib(default=None)
+
+    # Precomputed climatology store (see `titiler_patch.climatology`).
+    # Defaults to `sidecar_path(src_path, CLIMATOLOGY_SUFFIX)` when that store exists.
+    climatology_path: Optional[str] = attr.ib(default=None)
+
     ds: xarray.Dataset = attr.ib(init=False)
     input: xarray.DataArray = attr.ib(init=False)
+    _baseline: Optional[xarray.DataArray] = attr.ib(init=False, default=None)
+    _baseline_ds: Optional[xarray.Dataset] = attr.ib(init=False, default=None)
 
     _dims: List = attr.ib(init=False, factory=list)
 
@@ -227,12 +520,226 @@ class Reader(XarrayReader):
             self.variable,
             sel=self.sel,
             method=self.method,
+            dataset_key=(self.src_path, self.group),
         )
         super().__attrs_post_init__()
 
+        if self.baseline:
+            self._validate_baseline()
+
+    def _validate_baseline(self):
+        """Check the baseline option without reading any data."""
+        if self.baseline == CLIMATOLOGY:
+            if "time" not in self.input.coords:
+                raise InvalidSelection("Climatology baseline needs a time dimension")
+
+            if not numpy.issubdtype(self.input["time"].dtype, numpy.datetime64):
+                raise InvalidSelection("Climatology baseline needs decoded times")
+
+            # A single-year store is its own climatology (anomaly always 0)
+            years = numpy.unique(self.ds[self.variable]["time"].dt.year.values)
+            if len(years) < 2:
+                raise InvalidSelection(
+                    "Climatology baseline needs a multi-year store, "
+                    f"{self.src_path!r} covers {len(years)} year(s)"
+                )
+
+            if not self._climatology_path():
+                raise InvalidSelection(
+                    f"No climatology store for {self.src_path!r}, write one with "
+                    "`python -m titiler_patch.climatology`"
+                )
+
+        elif not self.baseline.partition("=")[1]:
+            raise InvalidSelection(
+                f"Invalid baseline {self.baseline!r}, expected `{CLIMATOLOGY}` or `dim=value`"
+            )
+
+    def _climatology_path(self) -> Optional[str]:
+        """Resolve the precomputed climatology store, if any."""
+        if self.climatology_path:
+            return self.climatology_path
+
+        path = sidecar_path(self.src_path, CLIMATOLOGY_SUFFIX)
+        return path if _store_exists(path) else None
+
+    def _get_baseline(self) -> Optional[xarray.DataArray]:
+        """Return the baseline field(s) matching `self.input`.
+
+        Resolved on first use only, so routes that don't read pixels (e.g
+        `/info`) never touch it.
+
+        """
+        if not self.baseline:
+            return None
+
+        if self._baseline is None:
+            self._baseline = self._compute_baseline()
+
+        return self._baseline
+
+    def _compute_baseline(self) -> xarray.DataArray:
+        if self.baseline == CLIMATOLOGY:
+            # Lazy `(month, y, x)` array, reads only the months/pixels needed
+            path = self._climatology_path()
+            self._baseline_ds = self.opener(
+                path,
+                group=self.group,
+                decode_times=self.decode_times,
+            )
+            clim = get_variable(
+                self._baseline_ds, self.variable, dataset_key=(path, self.group)
+            )
+            months = self.input["time"].dt.month - 1
+            base = clim.isel(month=months.values).drop_vars("month")
+            if months.ndim:
+                base = base.rename({"month": "time"}).assign_coords(
+                    time=self.input["time"]
+                )
+
+        else:
+            dim = self.baseline.partition("=")[0]
+            sel = [s for s in self.sel or [] if s.partition("=")[0] != dim]
+            sel.append(self.baseline)
+            key = (self.src_path, self.group, self.variable, tuple(sel), self.method)
+            base = baseline_cache.get(
+                key,
+                lambda: get_variable(
+                    self.ds,
+                    self.variable,
+                    sel=sel,
+                    method=self.method,
+                    dataset_key=(self.src_path, self.group),
+                )
+                .astype("float32")
+                .load(),
+            )
+
+        return base.rio.write_crs(self.input.rio.crs)
+
+    def part(self, bbox: BBox, **kwargs: Any) -> ImageData:
+        """Read part of the dataset, minus the baseline when one is set.
+
+        The baseline (a cached reference field or the matching months of the
+        climatology store) is read through the same warp as the data, so an
+        anomaly costs one extra read and an array subtraction.
+
+        """
+        img = super().part(bbox, **kwargs)
+
+        # rioxarray keeps an encoded `_FillValue` (e.g NaN) over the requested
+        # nodata when reprojecting, so mask the requested value explicitly
+        nodata = kwargs.get("nodata")
+        if nodata is not None:
+            data = img.array.data
+            img.array.mask |= (
+                numpy.isnan(data) if numpy.isnan(nodata) else data == nodata
+            )
+
+        base = self._get_baseline()
+        if base is None:
+            return img
+
+        # Zeros in the baseline are values, not nodata
+        kwargs.pop("nodata", None)
+        if base.ndim == 2:
+            kwargs.pop("indexes", None)
+
+        with XarrayReader(base, tms=self.tms) as src_dst:
+            ref = src_dst.part(bbox, **kwargs)
+
+        img.array = img.array.astype("float32") - ref.array.filled(0)
+        return img
+
+    def _timeseries_path(self) -> Optional[str]:
+        """Resolve the companion store to use for point queries, if any."""
+        if self.timeseries_path:
+            return self.timeseries_path
+
+        if self.src_path.lower().endswith((".nc", ".nc4")):
+            return None
+
+        path = sidecar_path(self.src_path, TIMESERIES_SUFFIX)
+        return path if _store_exists(path) else None
+
+    def point(self, lon: float, lat: float, **kwargs: Any) -> PointData:
+        """Read a pixel time series, from the time-contiguous store when available.
+
+        The map store holds one chunk per time slice, so a pixel series would
+        touch every chunk. The companion store keeps the whole series in one
+        chunk per small spatial tile. The baseline, when set, is subtracted
+        as in `part`.
+
+        """
+        ts_path = self._timeseries_path()
+        if not ts_path:
+            pt = super().point(lon, lat, **kwargs)
+
+        else:
+            with self.opener(
+                ts_path,
+                group=self.group,
+                decode_times=self.decode_times,
+            ) as ds:
+                da = get_variable(
+                    ds,
+                    self.variable,
+                    sel=self.sel,
+                    method=self.method,
+                    dataset_key=(ts_path, self.group),
+                )
+                with XarrayReader(da, tms=self.tms) as src_dst:
+                    pt = src_dst.point(lon, lat, **kwargs)
+
+        base = self._get_baseline()
+        if base is None:
+            return pt
+
+        # Same baseline as the map tiles
+        kwargs.pop("nodata", None)
+        if base.ndim == 2:
+            kwargs.pop("indexes", None)
+
+        with XarrayReader(base, tms=self.tms) as src_dst:
+            ref = src_dst.point(lon, lat, **kwargs)
+
+        pt.array = pt.array.astype("float32") - ref.array.filled(0)
+        return pt
+
+    def feature(
+        self,
+        shape: Dict,
+        dst_crs: Optional[CRS] = None,
+        shape_crs: CRS = WGS84_CRS,
+        **kwargs: Any,
+    ) -> ImageData:
+        """Read part of a dataset defined by a geojson feature.
+
+        Same as `XarrayReader.feature` but the cutline mask comes from the
+        geometry mask cache, so a polygon is only rasterized once per grid.
+
+        """
+        shape = _validate_shape_input(shape)
+        dst_crs = dst_crs or shape_crs
+
+        img = self.part(
+            featureBounds(shape),
+            dst_crs=dst_crs,
+            bounds_crs=shape_crs,
+            **kwargs,
+        )
+
+        cutline = mask_cache.cutline(shape, img, shape_crs=shape_crs)
+        img.cutline_mask = cutline
+        img.array.mask = numpy.where(~cutline, img.array.mask, True)
+
+        return img
+
     def close(self):
         """Close xarray dataset."""
         self.ds.close()
+        if self._baseline_ds is not None:
+            self._baseline_ds.close()
 
     def __exit__(self, exc_type, exc_value, traceback):
         """Support using with Context Managers."""
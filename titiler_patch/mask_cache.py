@@ -0,0 +1,212 @@
+"""Cache of rasterized geometry masks for repeated polygon statistics."""
+
+import hashlib
+import json
+import os
+import threading
+import warnings
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import attr
+import numpy
+from rasterio.crs import CRS
+from rasterio.errors import NotGeoreferencedWarning
+from rasterio.features import rasterize
+from rasterio.warp import transform_geom
+from rio_tiler.constants import WGS84_CRS
+from rio_tiler.models import ImageData
+from rio_tiler.utils import _validate_shape_input
+
+MASK_CACHE_SIZE = int(os.environ.get("GFED_MASK_CACHE_SIZE", 256))
+MASK_CACHE_DIR = os.environ.get("GFED_MASK_CACHE_DIR", None)
+MASK_CACHE_FILES = int(os.environ.get("GFED_MASK_CACHE_FILES", 4096))
+
+# Mask kinds: cutline is True outside the geometry (rio-tiler convention),
+# coverage is the fraction of each cell covered by the geometry
+CUTLINE = "cutline"
+COVERAGE = "coverage"
+
+
+@attr.s
+class GeometryMaskCache:
+    """LRU cache of cutline and coverage arrays.
+
+    Entries are keyed by mask kind + geometry hash + shape CRS + output grid
+    (CRS, transform, size) so the same polygon is rasterized once and reused
+    for every variable and time step read on that grid. Cutline and coverage
+    are computed on demand and cached separately: image endpoints only need
+    the (cheap) cutline, the supersampled coverage is only paid for by
+    statistics. When `directory` is set, entries are also persisted as `.npz`
+    files (at most `max_files`, least recently used removed first) and
+    reloaded across restarts.
+
+    """
+
+    maxsize: int = attr.ib(default=MASK_CACHE_SIZE)
+    directory: Optional[str] = attr.ib(default=MASK_CACHE_DIR)
+    max_files: int = attr.ib(default=MASK_CACHE_FILES)
+    cover_scale: int = attr.ib(default=10)
+
+    _entries: "OrderedDict[str, numpy.ndarray]" = attr.ib(
+        init=False, factory=OrderedDict
+    )
+    _lock: threading.Lock = attr.ib(init=False, factory=threading.Lock)
+    hits: int = attr.ib(init=False, default=0)
+    misses: int = attr.ib(init=False, default=0)
+
+    def key(self, kind: str, geometry: Dict, shape_crs: CRS, image: ImageData) -> str:
+        """Hash of mask kind + geometry + CRS + grid."""
+        payload = {
+            "kind": kind,
+            "geometry": geometry,
+            "shape_crs": shape_crs.to_string(),
+            "crs": image.crs.to_string(),
+            "transform": list(image.transform)[:6],
+            "size": [image.height, image.width],
+        }
+        if kind == COVERAGE:
+            payload["cover_scale"] = self.cover_scale
+
+        return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def _load(self, key: str) -> Optional[numpy.ndarray]:
+        if not self.directory:
+            return None
+
+        path = self._path(key)
+        try:
+            with numpy.load(path) as data:
+                mask = data["mask"]
+            # Mark as recently used for `_evict`
+            os.utime(path)
+        except (OSError, KeyError, ValueError):
+            return None
+
+        return mask
+
+    def _persist(self, key: str, mask: numpy.ndarray):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self._path(key) + f".{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            numpy.savez_compressed(f, mask=mask)
+        os.replace(tmp, self._path(key))
+
+        self._evict()
+
+    def _evict(self):
+        """Remove the least recently used files above `max_files`."""
+        files = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".npz"):
+                    continue
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    continue
+
+        if len(files) <= self.max_files:
+            return
+
+        files.sort()
+        for _, path in files[: len(files) - self.max_files]:
+            try:
+                os.remove(path)
+            except OSError:
+                # Already removed by another worker
+                pass
+
+    def _rasterize(
+        self, kind: str, geometry: Dict, shape_crs: CRS, image: ImageData
+    ) -> numpy.ndarray:
+        if kind == COVERAGE:
+            return image.get_coverage_array(
+                geometry, shape_crs=shape_crs, cover_scale=self.cover_scale
+            )
+
+        shape = geometry
+        if image.crs != shape_crs:
+            shape = transform_geom(shape_crs, image.crs, shape)
+
+        with warnings.catch_warnings():
+            warnings.filterwarnings(
+                "ignore",
+                category=NotGeoreferencedWarning,
+                module="rasterio",
+            )
+            return rasterize(
+                [shape],
+                out_shape=(image.height, image.width),
+                transform=image.transform,
+                all_touched=True,  # Mandatory for matching masks at different resolutions
+                default_value=0,
+                fill=1,
+                dtype="uint8",
+            ).astype("bool")
+
+    def get(
+        self,
+        kind: str,
+        shape: Dict,
+        image: ImageData,
+        shape_crs: CRS = WGS84_CRS,
+    ) -> numpy.ndarray:
+        """Return the (cached, read-only) `kind` mask of `shape` on `image`'s grid.
+
+        Args:
+            kind (str): `cutline` or `coverage`.
+            shape (dict): GeoJSON Feature or Geometry.
+            image (rio_tiler.models.ImageData): image defining the output grid.
+            shape_crs (rasterio.crs.CRS, optional): Coordinate Reference System of the shape. Defaults to `epsg:4326`.
+
+        Returns:
+            numpy.ndarray
+
+        """
+        if kind not in (CUTLINE, COVERAGE):
+            raise ValueError(f"Unknown mask kind: {kind!r}")
+
+        geometry = _validate_shape_input(shape)
+        key = self.key(kind, geometry, shape_crs, image)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        mask = self._load(key)
+        if mask is None:
+            mask = self._rasterize(kind, geometry, shape_crs, image)
+            if self.directory:
+                self._persist(key, mask)
+
+        # Shared between requests, make sure nobody updates it in place
+        mask.setflags(write=False)
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = mask
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+        return mask
+
+    def cutline(
+        self, shape: Dict, image: ImageData, shape_crs: CRS = WGS84_CRS
+    ) -> numpy.ndarray:
+        """Cutline mask (True outside `shape`) on `image`'s grid."""
+        return self.get(CUTLINE, shape, image, shape_crs=shape_crs)
+
+    def coverage(
+        self, shape: Dict, image: ImageData, shape_crs: CRS = WGS84_CRS
+    ) -> numpy.ndarray:
+        """Fraction of each `image` cell covered by `shape`."""
+        return self.get(COVERAGE, shape, image, shape_crs=shape_crs)
+
+
+mask_cache = GeometryMaskCache()
@@ -0,0 +1,316 @@
+"""Data-extent (occupancy) index to skip tiles without any data.
+
+Fire emissions are zero over most of the globe (oceans, deserts, ice) for
+any given month, yet a tile request still opens the store, reads and
+reprojects chunks before finding out everything is nodata. This module
+precomputes, per variable and time step, a bitmap of which `block x block`
+cell blocks hold at least one finite, non-zero value, and stores it as a
+small `.npz` sidecar next to the Zarr store. The tile endpoint checks it and
+answers with the shared empty tile without touching the data.
+
+Usage:
+
+    python -m titiler_patch.occupancy GFED5_combined_2002_2022.zarr
+
+"""
+
+import argparse
+import io
+import json
+import math
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import attr
+import numpy
+from morecantile import TileMatrixSet
+from rasterio.crs import CRS
+from rasterio.warp import transform_bounds
+from rio_tiler.types import BBox
+
+from titiler_patch.io_patch import (
+    InvalidSelection,
+    SelectionIndex,
+    get_variable,
+    sidecar_path,
+    ttl_cache,
+    xarray_open_dataset,
+)
+from titiler_patch.store_pool import POOLED_PROTOCOLS, store_pool
+
+OCCUPANCY_SUFFIX = "_occupancy.npz"
+
+# Neighbour cells (in source resolution) a resampled tile pixel may read
+_MARGIN_CELLS = 2
+
+
+def occupied_blocks(values: numpy.ndarray, block: int) -> numpy.ndarray:
+    """Reduce a 2D field to a `(ceil(ny / block), ceil(nx / block))` boolean grid.
+
+    A block is occupied if any of its cells is finite and non-zero.
+
+    """
+    ny, nx = values.shape
+    occupied = numpy.zeros(
+        (math.ceil(ny / block) * block, math.ceil(nx / block) * block), dtype="bool"
+    )
+    with numpy.errstate(invalid="ignore"):
+        occupied[:ny, :nx] = numpy.isfinite(values) & (values != 0)
+
+    return occupied.reshape(
+        occupied.shape[0] // block, block, occupied.shape[1] // block, block
+    ).any(axis=(1, 3))
+
+
+@attr.s
+class VariableOccupancy:
+    """Packed `(time, y blocks, x blocks)` occupancy bitmap of one variable."""
+
+    bits: numpy.ndarray = attr.ib()
+    times: numpy.ndarray = attr.ib()
+    x: numpy.ndarray = attr.ib()
+    y: numpy.ndarray = attr.ib()
+    block: int = attr.ib()
+
+    shape: tuple = attr.ib(init=False)
+    time_index: SelectionIndex = attr.ib(init=False)
+
+    def __attrs_post_init__(self):
+        """Derive block grid shape and time lookup."""
+        self.shape = (
+            math.ceil(len(self.y) / self.block),
+            math.ceil(len(self.x) / self.block),
+        )
+        self.time_index = SelectionIndex(self.times)
+
+    def blocks(self, position: int) -> numpy.ndarray:
+        """Boolean block grid of one time step."""
+        count = self.shape[0] * self.shape[1]
+        return (
+            numpy.unpackbits(self.bits[position], count=count)
+            .astype("bool")
+            .reshape(self.shape)
+        )
+
+    def _cells(self, coords: numpy.ndarray, lo: float, hi: float) -> numpy.ndarray:
+        res = abs(float(coords[1] - coords[0])) if len(coords) > 1 else 0.0
+        margin = _MARGIN_CELLS * res
+        return numpy.flatnonzero((coords >= lo - margin) & (coords <= hi + margin))
+
+    def has_data(self, position: int, bounds: BBox) -> bool:
+        """Whether any block within `bounds` (index CRS) holds data at `position`.
+
+        Bounds outside of the grid also return True, so the regular read path
+        handles them (e.g `TileOutsideBounds`).
+
+        """
+        minx, miny, maxx, maxy = bounds
+        cols = self._cells(self.x, minx, maxx)
+        rows = self._cells(self.y, miny, maxy)
+        if not cols.size or not rows.size:
+            return True
+
+        blocks = self.blocks(position)
+        return bool(
+            blocks[
+                rows[0] // self.block : rows[-1] // self.block + 1,
+                cols[0] // self.block : cols[-1] // self.block + 1,
+            ].any()
+        )
+
+
+@attr.s
+class OccupancyIndex:
+    """Occupancy bitmaps of the variables of one store."""
+
+    crs: CRS = attr.ib()
+    variables: Dict[str, VariableOccupancy] = attr.ib(factory=dict)
+
+    @classmethod
+    def from_bytes(cls, content: bytes) -> "OccupancyIndex":
+        """Load an index written by `write_occupancy_index`."""
+        with numpy.load(io.BytesIO(content)) as data:
+            meta = json.loads(str(data["meta"]))
+            variables = {
+                name: VariableOccupancy(
+                    bits=data[f"{name}.bits"],
+                    times=data[f"{name}.time"],
+                    x=data[f"{name}.x"],
+                    y=data[f"{name}.y"],
+                    block=meta["block"],
+                )
+                for name in meta["variables"]
+            }
+
+        return cls(crs=CRS.from_user_input(meta["crs"]), variables=variables)
+
+    def _position(
+        self,
+        occupancy: VariableOccupancy,
+        sel: Optional[List[str]],
+        method: Optional[str],
+    ) -> Optional[int]:
+        """Time position of a single `time=value` selection, None otherwise."""
+        if not sel or len(sel) != 1:
+            return None
+
+        dim, _, label = sel[0].partition("=")
+        if dim != "time" or not label or "/" in label:
+            return None
+
+        try:
+            return occupancy.time_index.position(label, method=method)
+        except InvalidSelection:
+            return None
+
+    def tile_has_data(
+        self,
+        variable: str,
+        sel: Optional[List[str]],
+        method: Optional[str],
+        tms: TileMatrixSet,
+        x: int,
+        y: int,
+        z: int,
+    ) -> bool:
+        """Whether tile `z/x/y` may show data.
+
+        Returns False only when the index proves the tile is empty, anything
+        it can't answer (unknown variable, unsupported selection...) is True.
+
+        """
+        occupancy = self.variables.get(variable)
+        if occupancy is None:
+            return True
+
+        position = self._position(occupancy, sel, method)
+        if position is None:
+            return True
+
+        bounds = tms.xy_bounds(x, y, z)
+        if tms.rasterio_crs != self.crs:
+            bounds = transform_bounds(
+                tms.rasterio_crs, self.crs, *bounds, densify_pts=21
+            )
+
+        return occupancy.has_data(position, bounds)
+
+
+@ttl_cache(maxsize=32)
+def get_occupancy_index(src_path: str) -> Optional[OccupancyIndex]:
+    """Load the occupancy sidecar, None if there is none.
+
+    The index is only an optimization: any failure to fetch or parse it
+    (missing, forbidden, network error, corrupt file...) means "no index".
+    Both outcomes are cached for `GFED_PROBE_TTL` seconds, so tiles don't
+    refetch a missing sidecar and one written later is still picked up.
+
+    """
+    import fsspec  # noqa
+
+    path = sidecar_path(src_path, OCCUPANCY_SUFFIX)
+    try:
+        if urlparse(path).scheme in POOLED_PROTOCOLS:
+            content = store_pool.cat_file(path)
+        else:
+            fs, root = fsspec.core.url_to_fs(path)
+            content = fs.cat_file(root)
+
+        return OccupancyIndex.from_bytes(content)
+    except Exception:
+        return None
+
+
+def write_occupancy_index(
+    src_path: str,
+    dst_path: Optional[str] = None,
+    variables: Optional[List[str]] = None,
+    block: int = 8,
+) -> str:
+    """Compute and write the occupancy sidecar of a Zarr store.
+
+    Time steps are read one at a time, so peak memory is one 2D field.
+
+    Args:
+        src_path (str): Zarr store path or URL.
+        dst_path (str, optional): output file. Defaults to `sidecar_path(src_path, OCCUPANCY_SUFFIX)`.
+        variables (list of str, optional): variables to index. Defaults to every `(time, y, x)` variable.
+        block (int): block size (in cells) along each spatial dimension.
+
+    Returns:
+        str: path of the written sidecar.
+
+    """
+    import fsspec  # noqa
+
+    dst_path = dst_path or sidecar_path(src_path, OCCUPANCY_SUFFIX)
+
+    arrays: Dict[str, numpy.ndarray] = {}
+    crs = None
+    with xarray_open_dataset(src_path) as ds:
+        if variables is None:
+            variables = [name for name, da in ds.data_vars.items() if "time" in da.dims]
+
+        for name in variables:
+            da = get_variable(ds, name)
+            if da.dims != ("time", "y", "x"):
+                raise ValueError(f"{name!r} is not a (time, y, x) variable: {da.dims}")
+
+            crs = crs or da.rio.crs.to_string()
+            arrays[f"{name}.bits"] = numpy.stack(
+                [
+                    numpy.packbits(occupied_blocks(da[i].values, block).ravel())
+                    for i in range(da.sizes["time"])
+                ]
+            )
+            arrays[f"{name}.time"] = da["time"].values
+            arrays[f"{name}.x"] = da["x"].values
+            arrays[f"{name}.y"] = da["y"].values
+
+    meta = {"block": block, "crs": crs, "variables": variables}
+
+    buffer = io.BytesIO()
+    numpy.savez_compressed(buffer, meta=numpy.array(json.dumps(meta)), **arrays)
+    with fsspec.open(dst_path, "wb") as f:
+        f.write(buffer.getvalue())
+
+    return dst_path
+
+
+def main(args: Optional[List[str]] = None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(
+        description="Write the occupancy sidecar used to skip empty tiles."
+    )
+    parser.add_argument("src_path", help="Zarr store path or URL.")
+    parser.add_argument(
+        "--dst-path",
+        default=None,
+        help=f"Output file. Defaults to `<src>{OCCUPANCY_SUFFIX}`.",
+    )
+    parser.add_argument(
+        "--variable",
+        dest="variables",
+        action="append",
+        default=None,
+        help="Variable to index (repeatable). Defaults to all time-varying variables.",
+    )
+    parser.add_argument(
+        "--block",
+        type=int,
+        default=8,
+        help="Block size, in cells, along each spatial dimension.",
+    )
+    opts = parser.parse_args(args)
+
+    dst = write_occupancy_index(
+        opts.src_path,
+        dst_path=opts.dst_path,
+        variables=opts.variables,
+        block=opts.block,
+    )
+    print(f"Wrote {dst}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Time-contiguous companion stores for point/time-series queries.
+
+The map stores are chunked spatially (one chunk per time slice), which is what
+tiles need but means a pixel time series touches every chunk of the variable.
+This module writes a companion store holding the same data rechunked with long
+time chunks and small spatial tiles, so a click reads one or two chunks.
+
+Usage:
+
+    python -m titiler_patch.rechunk GFED5_combined_2002_2022.zarr
+
+"""
+
+import argparse
+from typing import Dict, List, Optional
+
+import xarray
+
+from titiler_patch.io_patch import (
+    TIMESERIES_SUFFIX,
+    sidecar_path,
+    xarray_open_dataset,
+)
+
+
+def _timeseries_chunks(
+    da: xarray.DataArray,
+    time_chunk: int,
+    spatial_chunk: int,
+) -> Dict[str, int]:
+    """Chunk sizes for one variable: long along time, small tiles in space."""
+    return {
+        dim: (min(time_chunk, size) if time_chunk > 0 else size)
+        if dim == "time"
+        else min(spatial_chunk, size)
+        for dim, size in da.sizes.items()
+    }
+
+
+def write_timeseries_store(
+    src_path: str,
+    dst_path: Optional[str] = None,
+    variables: Optional[List[str]] = None,
+    time_chunk: int = -1,
+    spatial_chunk: int = 32,
+) -> str:
+    """Write a time-contiguous copy of a Zarr store.
+
+    Variables are loaded and written one at a time, so peak memory is one
+    full variable (~1GB for 21 years of monthly 0.25° data).
+
+    Args:
+        src_path (str): map-optimized Zarr store path or URL.
+        dst_path (str, optional): output store. Defaults to `sidecar_path(src_path, TIMESERIES_SUFFIX)`.
+        variables (list of str, optional): variables to rechunk. Defaults to every variable with a `time` dimension.
+        time_chunk (int): chunk length along time. `-1` keeps the whole series in one chunk.
+        spatial_chunk (int): chunk size along each spatial dimension.
+
+    Returns:
+        str: path of the written store.
+
+    """
+    dst_path = dst_path or sidecar_path(src_path, TIMESERIES_SUFFIX)
+
+    with xarray_open_dataset(src_path) as ds:
+        variables = variables or [
+            name for name, da in ds.data_vars.items() if "time" in da.dims
+        ]
+
+        mode = "w"
+        for name in variables:
+            da = ds[name].load()
+
+            # Drop the source chunking so the new encoding is used
+            for key in ("chunks", "preferred_chunks", "shards"):
+                da.encoding.pop(key, None)
+
+            chunks = _timeseries_chunks(da, time_chunk, spatial_chunk)
+            da.to_dataset().to_zarr(
+                dst_path,
+                mode=mode,
+                zarr_format=3,
+                encoding={name: {"chunks": tuple(chunks[d] for d in da.dims)}},
+            )
+            mode = "a"
+
+    return dst_path
+
+
+def main(args: Optional[List[str]] = None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(
+        description="Write a time-contiguous companion store for point/time-series queries."
+    )
+    parser.add_argument("src_path", help="Map-optimized Zarr store path or URL.")
+    parser.add_argument(
+        "--dst-path",
+        default=None,
+        help=f"Output store. Defaults to `<src>{TIMESERIES_SUFFIX}`.",
+    )
+    parser.add_argument(
+        "--variable",
+        dest="variables",
+        action="append",
+        default=None,
+        help="Variable to rechunk (repeatable). Defaults to all time-varying variables.",
+    )
+    parser.add_argument(
+        "--time-chunk",
+        type=int,
+        default=-1,
+        help="Chunk length along time (-1 for the whole series).",
+    )
+    parser.add_argument(
+        "--spatial-chunk",
+        type=int,
+        default=32,
+        help="Chunk size along each spatial dimension.",
+    )
+    opts = parser.parse_args(args)
+
+    dst = write_timeseries_store(
+        opts.src_path,
+        dst_path=opts.dst_path,
+        variables=opts.variables,
+        time_chunk=opts.time_chunk,
+        spatial_chunk=opts.spatial_chunk,
+    )
+    print(f"Wrote {dst}")
+
+
+if __name__ == "__main__":
+    main()
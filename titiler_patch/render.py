@@ -0,0 +1,289 @@
+"""Fast colormap + encoding stage for single band tiles."""
+
+import functools
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Sequence, Tuple
+
+import attr
+import numpy
+from rio_tiler.colormap import make_lut
+from rio_tiler.models import ImageData
+from rio_tiler.types import ColorMapType, IntervalTuple
+from rio_tiler.utils import linear_rescale, render
+
+from titiler.core.resources.enums import ImageType
+from titiler.core.utils import render_image
+
+PNG_ZLEVEL = int(os.environ.get("GFED_PNG_ZLEVEL", 6))
+LUT_CACHE_SIZE = int(os.environ.get("GFED_LUT_CACHE_SIZE", 64))
+
+# Formats a client can pick with `Accept` (first one wins on equal quality)
+NEGOTIABLE_FORMATS = (ImageType.webp, ImageType.png)
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def colormap_key(colormap: ColorMapType) -> Optional[Hashable]:
+    """Cache key of a colormap, None if it can't be applied as a 256 entries LUT."""
+    if not isinstance(colormap, dict):
+        return None
+
+    name = getattr(colormap, "name", None)
+    if name:
+        return name
+
+    if not all(isinstance(k, int) and 0 <= k < 256 for k in colormap):
+        return None
+
+    return tuple(sorted((k, tuple(v)) for k, v in colormap.items()))
+
+
+@attr.s
+class LUTCache:
+    """LRU cache of compiled `(256, 4)` uint8 lookup tables.
+
+    Named colormaps are keyed by name, custom ones by content, so each
+    colormap is compiled once and then applied with a single gather.
+
+    """
+
+    maxsize: int = attr.ib(default=LUT_CACHE_SIZE)
+
+    _entries: "OrderedDict[Hashable, numpy.ndarray]" = attr.ib(
+        init=False, factory=OrderedDict
+    )
+    _lock: threading.Lock = attr.ib(init=False, factory=threading.Lock)
+    hits: int = attr.ib(init=False, default=0)
+    misses: int = attr.ib(init=False, default=0)
+
+    def get(self, colormap: ColorMapType) -> Optional[numpy.ndarray]:
+        """Return the (read-only) LUT of `colormap`, None for interval colormaps."""
+        key = colormap_key(colormap)
+        if key is None:
+            return None
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        lut = make_lut(colormap)
+        lut.setflags(write=False)
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = lut
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+        return lut
+
+
+lut_cache = LUTCache()
+
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(data))
+        + tag
+        + data
+        + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+    )
+
+
+def encode_png(
+    index: numpy.ndarray, palette: numpy.ndarray, zlevel: int = PNG_ZLEVEL
+) -> bytes:
+    """Encode a 2D uint8 index array as a paletted PNG.
+
+    Args:
+        index (numpy.ndarray): `(height, width)` uint8 palette indexes.
+        palette (numpy.ndarray): `(n, 4)` uint8 RGBA palette (n <= 256).
+        zlevel (int): zlib compression level (0-9).
+
+    Returns:
+        bytes: PNG file content.
+
+    """
+    height, width = index.shape
+
+    # One scanline = filter type (0: None) + indexes
+    raw = numpy.zeros((height, width + 1), dtype="uint8")
+    raw[:, 1:] = index
+
+    # tRNS only needs the entries up to the last non opaque one
+    alpha = palette[:, 3]
+    translucent = numpy.flatnonzero(alpha != 255)
+
+    return b"".join(
+        [
+            PNG_SIGNATURE,
+            _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0)),
+            _png_chunk(b"PLTE", numpy.ascontiguousarray(palette[:, :3]).tobytes()),
+            (
+                _png_chunk(b"tRNS", alpha[: translucent[-1] + 1].tobytes())
+                if translucent.size
+                else b""
+            ),
+            _png_chunk(b"IDAT", zlib.compress(raw.tobytes(), zlevel)),
+            _png_chunk(b"IEND", b""),
+        ]
+    )
+
+
+@functools.lru_cache(maxsize=16)
+def empty_tile(output_format: ImageType, width: int, height: int) -> bytes:
+    """Fully transparent tile, encoded once per format and size."""
+    if output_format == ImageType.webp:
+        return render(
+            numpy.zeros((3, height, width), dtype="uint8"),
+            numpy.zeros((height, width), dtype="uint8"),
+            img_format=output_format.driver,
+            **output_format.profile,
+        )
+
+    return encode_png(
+        numpy.zeros((height, width), dtype="uint8"),
+        numpy.zeros((1, 4), dtype="uint8"),
+        zlevel=9,
+    )
+
+
+def negotiate_format(accept: Optional[str]) -> Optional[ImageType]:
+    """Pick the output format from an `Accept` header.
+
+    Only media types listed explicitly are considered (`*/*` or `image/*`
+    keep the default png/jpeg choice), the highest `q` wins and ties go to
+    the first of `NEGOTIABLE_FORMATS`.
+
+    Returns:
+        ImageType or None when the client doesn't ask for one of `NEGOTIABLE_FORMATS`.
+
+    """
+    if not accept:
+        return None
+
+    quality = {}
+    for item in accept.split(","):
+        media_type, *params = [p.strip() for p in item.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+
+        quality.setdefault(media_type.lower(), q)
+
+    best, best_q = None, 0.0
+    for fmt in NEGOTIABLE_FORMATS:
+        q = quality.get(fmt.mediatype, 0.0)
+        if q > best_q:
+            best, best_q = fmt, q
+
+    return best
+
+
+def _rescale_index(
+    data: numpy.ndarray, valid: numpy.ndarray, in_range: IntervalTuple
+) -> numpy.ndarray:
+    """Rescale to 0-255 LUT indexes (same rounding as `ImageData.rescale`)."""
+    scaled = numpy.where(valid, linear_rescale(data, in_range, (0, 255)), 0)
+    with numpy.errstate(invalid="ignore"):
+        return scaled.astype(data.dtype).astype("uint8")
+
+
+def render_tile(  # noqa: C901
+    image: ImageData,
+    colormap: Optional[ColorMapType] = None,
+    output_format: Optional[ImageType] = None,
+    add_mask: bool = True,
+    rescale: Optional[Sequence[IntervalTuple]] = None,
+    color_formula: Optional[str] = None,
+    zlevel: Optional[int] = None,
+    **kwargs: Any,
+) -> Tuple[bytes, str]:
+    """Drop-in replacement of `titiler.core.utils.render_image`.
+
+    Masked-out tiles short-circuit to a shared transparent tile and single
+    band data with a 256 entries colormap is rescaled, mapped through a cached
+    LUT and encoded as a paletted PNG (or RGBA WebP). Everything else is
+    rendered by `render_image`.
+
+    Args:
+        zlevel (int, optional): zlib level of paletted PNGs. Defaults to `GFED_PNG_ZLEVEL`.
+
+    """
+    mask = image.mask
+    if output_format is None:
+        output_format = ImageType.jpeg if mask.all() else ImageType.png
+
+    if output_format not in (ImageType.png, ImageType.webp) or not add_mask:
+        lut = None
+    elif not mask.any():
+        return empty_tile(output_format, image.width, image.height), (
+            output_format.mediatype
+        )
+    elif image.count != 1 or color_formula or colormap is None:
+        lut = None
+    else:
+        lut = lut_cache.get(colormap)
+
+    data = image.array.data[0]
+    if lut is None or (not rescale and data.dtype != numpy.uint8):
+        return render_image(
+            image,
+            colormap=colormap,
+            output_format=output_format,
+            add_mask=add_mask,
+            rescale=rescale,
+            color_formula=color_formula,
+            **kwargs,
+        )
+
+    valid = mask != 0
+    index = _rescale_index(data, valid, rescale[0]) if rescale else data
+
+    if output_format == ImageType.png:
+        palette = lut
+        if not valid.all():
+            transparent = numpy.flatnonzero(lut[:, 3] == 0)
+            if not transparent.size:
+                # Borrow a colormap entry no valid pixel uses for the masked ones
+                counts = numpy.bincount(index[valid], minlength=256)
+                transparent = numpy.flatnonzero(counts == 0)
+                if transparent.size:
+                    palette = lut.copy()
+                    palette[transparent[0]] = 0
+
+            if transparent.size:
+                index = numpy.where(valid, index, numpy.uint8(transparent[0]))
+            else:
+                palette = None
+
+        if palette is not None:
+            return (
+                encode_png(
+                    index, palette, zlevel=PNG_ZLEVEL if zlevel is None else zlevel
+                ),
+                output_format.mediatype,
+            )
+
+    # WebP, or all 256 colors in use around masked pixels: RGBA through GDAL
+
+    rgba = lut[index]
+    alpha = numpy.bitwise_and(rgba[..., 3], mask)
+    content = render(
+        numpy.moveaxis(rgba[..., :3], -1, 0),
+        alpha,
+        img_format=output_format.driver,
+        **{**kwargs, **output_format.profile},
+    )
+    return content, output_format.mediatype
@@ -0,0 +1,209 @@
+"""Priority-aware tile scheduling with client-disconnect cancellation."""
+
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List, Tuple, TypeVar
+
+import attr
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+
+TILE_WORKERS = int(os.environ.get("GFED_TILE_WORKERS", 8))
+TILE_QUEUE_SIZE = int(os.environ.get("GFED_TILE_QUEUE_SIZE", 64))
+TILE_RETRY_AFTER = int(os.environ.get("GFED_TILE_RETRY_AFTER", 1))
+
+T = TypeVar("T")
+
+
+class TileCancelled(Exception):
+    """The client went away before the tile was rendered."""
+
+
+class SchedulerSaturated(Exception):
+    """All workers are busy and the queue is full."""
+
+
+class CancelToken:
+    """Cancellation flag checked by the worker thread between stages."""
+
+    def __init__(self):
+        """Create a non-cancelled token."""
+        self._event = threading.Event()
+        self.stage = "queued"
+
+    def cancel(self):
+        """Flag the job as abandoned."""
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the job was abandoned."""
+        return self._event.is_set()
+
+    def checkpoint(self, stage: str):
+        """Enter `stage`, or stop here if the client is gone."""
+        if self._event.is_set():
+            raise TileCancelled(f"Cancelled before {stage}")
+        self.stage = stage
+
+
+@attr.s
+class TileScheduler:
+    """Bounded, priority-ordered executor for blocking tile work.
+
+    At most `max_workers` tiles run at once; up to `max_queue` more wait,
+    served lowest zoom first and, within a zoom, newest first (after a pan
+    or zoom the newest requests are the visible viewport, older ones are
+    mostly tiles Leaflet already dropped). Queued and running jobs are
+    cancelled as soon as their client disconnects (or their request task is
+    cancelled); beyond the queue limit requests are rejected so callers can
+    answer 503 + Retry-After.
+
+    All scheduler state is only touched from the event loop, the blocking
+    work runs in the threadpool.
+
+    """
+
+    max_workers: int = attr.ib(default=TILE_WORKERS)
+    max_queue: int = attr.ib(default=TILE_QUEUE_SIZE)
+    retry_after: int = attr.ib(default=TILE_RETRY_AFTER)
+    poll_interval: float = attr.ib(default=0.05)
+
+    _running: int = attr.ib(init=False, default=0)
+    _waiters: List[Tuple[Tuple, asyncio.Future]] = attr.ib(init=False, factory=list)
+    _seq: Any = attr.ib(init=False, factory=itertools.count)
+    _counters: Counter = attr.ib(init=False, factory=Counter)
+
+    @property
+    def queued(self) -> int:
+        """Number of jobs waiting for a worker."""
+        return sum(1 for _, fut in self._waiters if not fut.done())
+
+    async def _acquire(self, request: Request, priority: Tuple):
+        """Wait for a worker slot, giving up if the client disconnects."""
+        if self._running < self.max_workers and not self.queued:
+            self._running += 1
+            return
+
+        if self.queued >= self.max_queue:
+            self._counters["rejected"] += 1
+            raise SchedulerSaturated("Tile queue is full")
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, ((*priority, -next(self._seq)), fut))
+
+        while True:
+            try:
+                await asyncio.wait_for(asyncio.shield(fut), self.poll_interval)
+                return
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    self._abandon(fut)
+                    raise TileCancelled("Client disconnected while queued")
+            except asyncio.CancelledError:
+                # Request task cancelled (e.g server shutdown, timeout middleware)
+                self._abandon(fut)
+                raise
+
+    def _abandon(self, fut: asyncio.Future):
+        """Drop a queued job, passing its slot on if it was already granted."""
+        if fut.done() and not fut.cancelled():
+            self._release()
+        else:
+            fut.cancel()
+        self._counters["cancelled_queued"] += 1
+
+    def _release(self):
+        """Hand the slot to the best waiting job, or free it."""
+        while self._waiters:
+            _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                return
+
+        self._running -= 1
+
+    def _release_when_done(self, task: asyncio.Future):
+        """Free the slot of an abandoned job once its thread returns."""
+        if not task.cancelled():
+            # Consume the outcome so asyncio doesn't log it as never retrieved
+            task.exception()
+        self._release()
+
+    async def run(
+        self,
+        request: Request,
+        func: Callable[[CancelToken], T],
+        priority: Tuple = (),
+    ) -> T:
+        """Run `func(token)` in the threadpool once scheduled.
+
+        Args:
+            request (starlette.requests.Request): request to watch for disconnects.
+            func (callable): blocking work, should call `token.checkpoint(stage)` between stages.
+            priority (tuple): sort key, lower runs first (e.g `(z,)`).
+
+        Returns:
+            `func` result.
+
+        Raises:
+            TileCancelled: the client disconnected (job skipped or stopped at a checkpoint).
+            SchedulerSaturated: queue is full.
+
+        """
+        await self._acquire(request, priority)
+
+        token = CancelToken()
+        task = asyncio.ensure_future(run_in_threadpool(func, token))
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=self.poll_interval)
+                if done:
+                    break
+
+                if not token.cancelled and await request.is_disconnected():
+                    token.cancel()
+
+        except asyncio.CancelledError:
+            # The thread can't be interrupted: stop it at its next checkpoint
+            # and keep its slot until it actually returns
+            token.cancel()
+            self._counters["cancelled_running"] += 1
+            task.add_done_callback(self._release_when_done)
+            raise
+
+        try:
+            result = task.result()
+        except TileCancelled:
+            self._counters["cancelled_running"] += 1
+            raise
+        finally:
+            self._release()
+
+        self._counters["completed"] += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Return scheduler configuration and counters."""
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": self._running,
+            "queued": self.queued,
+            **{
+                name: self._counters[name]
+                for name in (
+                    "completed",
+                    "cancelled_queued",
+                    "cancelled_running",
+                    "rejected",
+                )
+            },
+        }
+
+
+tile_scheduler = TileScheduler()
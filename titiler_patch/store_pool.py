@@ -0,0 +1,229 @@
+"""Long-lived, pooled fsspec filesystems for Zarr stores served over HTTP(S)."""
+
+import asyncio
+import os
+import threading
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+from urllib.parse import urlparse
+
+import attr
+
+MAX_CONNECTIONS = int(os.environ.get("GFED_MAX_CONNECTIONS", 64))
+KEEPALIVE_TIMEOUT = float(os.environ.get("GFED_KEEPALIVE_TIMEOUT", 60))
+REQUEST_CONCURRENCY = int(os.environ.get("GFED_REQUEST_CONCURRENCY", 32))
+MAX_RETRIES = int(os.environ.get("GFED_MAX_RETRIES", 3))
+RETRY_BACKOFF = float(os.environ.get("GFED_RETRY_BACKOFF", 0.2))
+
+POOLED_PROTOCOLS = ("http", "https")
+
+T = TypeVar("T")
+
+
+def _is_transient(exc: BaseException) -> bool:
+    """Whether a failed request is worth retrying.
+
+    Connection errors, timeouts, 5xx and 429 are; other HTTP errors (403,
+    400...) won't change on retry and fail right away.
+
+    """
+    import aiohttp
+
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status >= 500 or exc.status == 429
+
+    return isinstance(
+        exc,
+        (
+            aiohttp.ClientConnectionError,
+            aiohttp.ClientPayloadError,
+            asyncio.TimeoutError,
+        ),
+    )
+
+
+def _retrying_store_class():
+    """Build the retrying FsspecStore subclass (zarr is an optional import)."""
+    from zarr.storage import FsspecStore
+
+    class RetryingFsspecStore(FsspecStore):
+        """FsspecStore retrying transient HTTP errors with exponential backoff."""
+
+        pool: "StorePool"
+
+        async def get(self, key, prototype, byte_range=None):
+            """Get a chunk, retrying transient errors."""
+            return await self.pool.retry(super().get, key, prototype, byte_range)
+
+        async def get_partial_values(self, prototype, key_ranges):
+            """Get several chunks concurrently, retrying transient errors."""
+            return await self.pool.retry(
+                super().get_partial_values, prototype, list(key_ranges)
+            )
+
+    return RetryingFsspecStore
+
+
+@attr.s
+class StorePool:
+    """Pool of asynchronous HTTP filesystems, one per endpoint.
+
+    Each endpoint (scheme + host) gets one `HTTPFileSystem` whose aiohttp
+    session is created once and kept alive, so TLS handshakes and TCP
+    connections are reused across requests instead of set up per tile.
+
+    """
+
+    max_connections: int = attr.ib(default=MAX_CONNECTIONS)
+    keepalive_timeout: float = attr.ib(default=KEEPALIVE_TIMEOUT)
+    concurrency: int = attr.ib(default=REQUEST_CONCURRENCY)
+    retries: int = attr.ib(default=MAX_RETRIES)
+    backoff: float = attr.ib(default=RETRY_BACKOFF)
+
+    _filesystems: Dict[Tuple[str, str], Any] = attr.ib(init=False, factory=dict)
+    _counters: Counter = attr.ib(init=False, factory=Counter)
+    _lock: threading.Lock = attr.ib(init=False, factory=threading.Lock)
+    _store_class: Optional[type] = attr.ib(init=False, default=None)
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self._counters[name] += n
+
+    def _trace_config(self):
+        """aiohttp hooks feeding the pool statistics."""
+        import aiohttp
+
+        async def on_request_start(session, ctx, params):
+            self._count("requests")
+
+        async def on_connection_create_end(session, ctx, params):
+            self._count("connections_created")
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self._count("connections_reused")
+
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(on_request_start)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace
+
+    async def _get_client(self, **kwargs):
+        """Create the (single) aiohttp session of a pooled filesystem."""
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=300,
+        )
+        self._count("sessions")
+        return aiohttp.ClientSession(
+            connector=connector,
+            trace_configs=[self._trace_config()],
+            **kwargs,
+        )
+
+    def filesystem(self, src_path: str):
+        """Return the pooled asynchronous filesystem for `src_path`'s endpoint."""
+        from fsspec.implementations.http import HTTPFileSystem
+
+        parsed = urlparse(src_path)
+        key = (parsed.scheme, parsed.netloc)
+        with self._lock:
+            if key not in self._filesystems:
+                fs = HTTPFileSystem(
+                    asynchronous=True,
+                    get_client=self._get_client,
+                    skip_instance_cache=True,
+                )
+                # Parallelism of multi-chunk fetches (`_cat_ranges`)
+                fs.batch_size = self.concurrency
+                self._filesystems[key] = fs
+
+            return self._filesystems[key]
+
+    async def retry(self, func: Callable[..., Awaitable[T]], *args: Any) -> T:
+        """Await `func(*args)`, retrying transient errors with exponential backoff."""
+        for attempt in range(self.retries + 1):
+            try:
+                return await func(*args)
+            except Exception as e:
+                if not _is_transient(e):
+                    raise
+
+                if attempt == self.retries:
+                    self._count("errors")
+                    raise
+
+                self._count("retries")
+                await asyncio.sleep(self.backoff * 2**attempt)
+
+    def exists(self, path: str) -> bool:
+        """Check if a file exists, through the pooled session."""
+        from zarr.core.sync import sync
+
+        return sync(self.retry(self.filesystem(path)._exists, path))
+
+    def cat_file(self, path: str) -> bytes:
+        """Read a whole file, through the pooled session."""
+        from zarr.core.sync import sync
+
+        return sync(self.retry(self.filesystem(path)._cat_file, path))
+
+    def store(self, src_path: str):
+        """Return a read-only Zarr store for `src_path` backed by the pool."""
+        import zarr
+
+        # Bound how many chunk requests zarr issues at once for multi-chunk reads
+        if zarr.config.get("async.concurrency") != self.concurrency:
+            zarr.config.set({"async.concurrency": self.concurrency})
+
+        if self._store_class is None:
+            self._store_class = _retrying_store_class()
+
+        store = self._store_class(
+            self.filesystem(src_path),
+            read_only=True,
+            path=src_path.rstrip("/"),
+        )
+        store.pool = self
+        return store
+
+    def close(self):
+        """Close the pooled sessions (they live on zarr's IO event loop)."""
+        from zarr.core.sync import sync
+
+        with self._lock:
+            sessions = [
+                fs._session for fs in self._filesystems.values() if fs._session
+            ]
+            self._filesystems.clear()
+
+        for session in sessions:
+            sync(session.close())
+
+    def stats(self) -> Dict[str, Any]:
+        """Return pool configuration and counters."""
+        with self._lock:
+            return {
+                "endpoints": [f"{s}://{h}" for s, h in self._filesystems],
+                "max_connections": self.max_connections,
+                "keepalive_timeout": self.keepalive_timeout,
+                "concurrency": self.concurrency,
+                "max_retries": self.retries,
+                **{
+                    name: self._counters[name]
+                    for name in (
+                        "sessions",
+                        "requests",
+                        "connections_created",
+                        "connections_reused",
+                        "retries",
+                        "errors",
+                    )
+                },
+            }
+
+
+store_pool = StorePool()